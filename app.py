@@ -1,20 +1,29 @@
 import os
 import sys
 import logging
+import datetime as dt
 from dotenv import load_dotenv
 from telegram import BotCommand
-from telegram.ext import Application, CommandHandler
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from services.config_validator import validate_config
 from services.error_handler import on_error
+from services import http_client
+from services.dexscreener import flush_pair_index, start_refresher, stop_refresher
+from services.pricelog import price_log
+from services.history import COMPACT_INTERVAL_HOURS, price_history
+from services.storage import close_store
+from services.feeds import feed_cache
+from services.outbox import outbox
 from scheduler import schedule_hubs
-from services.ritual_time import ritual_call
+from services.ritual_time import prepare_ritual, ritual_call
 
 from commands.start import start
 from commands.status import status
-from commands.news import news
+from commands.news import flush_rotation, news, news_page
 from commands.token import token, health_check
+from commands.studies import DIGEST_INTERVAL_HOURS, refresh_study_digest, studies
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -50,6 +59,7 @@ async def set_bot_info(app: Application) -> None:
                 BotCommand("status", "Bot health check & blessing"),
                 BotCommand("token", "Token price (default: weedcoin)"),
                 BotCommand("news", "Cryptocurrency & market news rotation"),
+                BotCommand("studies", "Cannabis research & health awareness"),
                 BotCommand("health", "Quick health status"),
             ]
         )
@@ -70,6 +80,7 @@ def build_app() -> Application:
         Application.builder()
         .token(bot_token)
         .job_queue(None)
+        .rate_limiter(outbox)  # every outbound send: priority queue + pacing (services.outbox)
         .build()
     )
 
@@ -82,28 +93,62 @@ def build_app() -> Application:
     app.add_handler(CommandHandler("news", news))
     app.add_handler(CommandHandler("token", token))
     app.add_handler(CommandHandler("health", health_check))
+    app.add_handler(CommandHandler("studies", studies))
+    app.add_handler(CallbackQueryHandler(news_page, pattern=r"^news:"))
 
     # Start APScheduler and schedule hubs (04:20 in each hub timezone)
     sched = AsyncIOScheduler(timezone=os.getenv("TZ", "America/Los_Angeles"))
     sched.start()
 
-    schedule_hubs(sched, ritual_call, app=app)
+    schedule_hubs(sched, ritual_call, app=app, prepare=prepare_ritual)
+
+    # Price history retention (sync job: APScheduler runs it in a worker thread)
+    sched.add_job(
+        price_history.compact, "interval", hours=COMPACT_INTERVAL_HOURS,
+        id="history:compact", replace_existing=True, coalesce=True, max_instances=1,
+    )
+
+    # /studies digest: built in the background (first run as soon as the loop starts)
+    sched.add_job(
+        refresh_study_digest, "interval", hours=DIGEST_INTERVAL_HOURS,
+        id="studies:digest", replace_existing=True, coalesce=True, max_instances=1,
+        next_run_time=dt.datetime.now(dt.timezone.utc), misfire_grace_time=None,
+    )
     logger.info("Scheduler armed (APScheduler): %d jobs", len(sched.get_jobs()))
 
     # Keep reference alive
     app.bot_data["apscheduler"] = sched
 
-    # Clean shutdown for APScheduler
-    async def _shutdown_scheduler(app: Application) -> None:
+    # Clean shutdown for APScheduler and the shared HTTP pool
+    async def _shutdown(app: Application) -> None:
         sched = app.bot_data.get("apscheduler")
         if sched:
             logger.info("Shutting down APScheduler...")
             sched.shutdown(wait=False)
 
-    app.post_shutdown = _shutdown_scheduler
+        await stop_refresher()
+        await feed_cache.stop()
+        flush_pair_index()
+
+        logger.info("Flushing price log...")
+        await price_log.stop()
+        price_history.close()
+        flush_rotation()
+        close_store()
+
+        logger.info("Closing HTTP connection pool...")
+        await http_client.aclose()
+
+    app.post_shutdown = _shutdown
+
+    # Telegram UI metadata + background workers (runs once after init)
+    async def _post_init(app: Application) -> None:
+        await set_bot_info(app)
+        start_refresher()
+        price_log.start()
+        feed_cache.start()
 
-    # Telegram UI metadata (runs once after init)
-    app.post_init = set_bot_info
+    app.post_init = _post_init
 
     logger.info("Bot initialized successfully")
     return app
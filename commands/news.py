@@ -1,9 +1,11 @@
-import xml.etree.ElementTree as ET
-import requests
 import logging
-from telegram import Update
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 from config import SETTINGS
+from services.feeds import feed_cache
+from services.news_index import NewsIndex
+from services.rotation import UserRotation
 
 logger = logging.getLogger(__name__)
 
@@ -41,71 +43,81 @@ REGIONAL_FEEDS = {
     ],
 }
 
-# Track user call counts for rotation
-_user_calls = {}
+# Track user call counts for rotation (bounded, persisted)
+_user_calls = UserRotation("news")
 
+NEWS_CATEGORIES = {"crypto": CRYPTO_NEWS, "market": MARKET_NEWS, **REGIONAL_FEEDS}
 
-def _fetch_one(url: str):
-    """Fetch the first valid item from an RSS feed."""
-    try:
-        r = requests.get(url, timeout=10, headers={"User-Agent": "Toka420Bot/1.0"})
-        r.raise_for_status()
-
-        root = ET.fromstring(r.content)
-
-        # RSS: <rss><channel>...
-        channel = root.find("./channel")
-        if channel is None:
-            # Atom feeds sometimes look different; fail gracefully
-            logger.debug("No RSS channel found for feed: %s", url)
-            return None
-
-        chan_title = (channel.findtext("title") or "").strip()
-        item = channel.find("item")
-        if item is None:
-            logger.debug("No items in feed: %s", url)
-            return None
-
-        title = (item.findtext("title") or "").strip()
-        link = (item.findtext("link") or "").strip()
-
-        # Some feeds use <link href="..."> or have whitespace/newlines
-        if not link:
-            link_el = item.find("link")
-            if link_el is not None and link_el.attrib.get("href"):
-                link = link_el.attrib["href"].strip()
-
-        if not title or not link:
-            logger.debug("Invalid item in feed: %s", url)
-            return None
-
-        return chan_title, title, link
-
-    except requests.Timeout:
-        logger.warning("Timeout fetching feed: %s", url)
-        return None
-    except requests.RequestException as e:
-        logger.warning("Request error fetching feed %s: %s", url, e)
-        return None
-    except ET.ParseError as e:
-        logger.warning("XML parse error in feed %s: %s", url, e)
-        return None
-    except Exception as e:
-        logger.exception("Unexpected error fetching feed %s: %s", url, e)
-        return None
+CATEGORY_TITLES = {
+    "crypto": ("💰", "Cryptocurrency News"),
+    "market": ("📈", "Market and Finance News"),
+}
+
+# Every configured feed is kept warm by the shared feed cache and indexed per category
+feed_cache.watch(url for urls in NEWS_CATEGORIES.values() for url in urls)
+_index = NewsIndex(feed_cache, NEWS_CATEGORIES)
 
 
 def _get_category_cycle(user_id: int) -> str:
     """Rotate through 2 categories per user call (crypto → market)."""
-    call_count = _user_calls.get(user_id, 0)
-    _user_calls[user_id] = call_count + 1
+    call_count = _user_calls.next(user_id)
     return ["crypto", "market"][call_count % 2]
 
 
+def rotation_stats() -> dict:
+    return _user_calls.stats()
+
+
+def flush_rotation() -> None:
+    """Persist pending rotation changes (called on shutdown)."""
+    _user_calls.flush()
+
+
+def _fmt_age(seconds) -> str:
+    if seconds is None:
+        return "just now"
+    minutes = int(seconds // 60)
+    if minutes < 1:
+        return "just now"
+    if minutes < 60:
+        return f"{minutes}m ago"
+    hours = minutes // 60
+    return f"{hours}h ago" if hours < 48 else f"{hours // 24}d ago"
+
+
 def _reply_target(update: Update):
     return update.effective_message
 
 
+def _categories(category: str):
+    """Index categories to try, in order: the rotated one, then the configured region."""
+    scope = (getattr(SETTINGS, "TELEGRAM_SCOPE", None) or "all").lower()
+    return (category, scope) if scope in REGIONAL_FEEDS else (category,)
+
+
+def _render(category: str, item) -> str:
+    emoji, title = CATEGORY_TITLES.get(category, ("🌍", "Regional Crypto News"))
+    return f"""
+{emoji} **{title}**
+
+**{item.title}**
+
+📰 Source: {item.channel} · {_fmt_age(item.age())}
+🔗 [Read more]({item.link})
+
+--------------------
+*Call `/news` again for the next category*
+*Categories rotate: Crypto → Markets*
+"""
+
+
+def _keyboard(category: str, position: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("◀ Prev", callback_data=f"news:p:{category}:{position}"),
+        InlineKeyboardButton("Next ▶", callback_data=f"news:n:{category}:{position}"),
+    ]])
+
+
 async def news(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send rotating news: Crypto → Markets, with optional regional fallback."""
     user_id = update.effective_user.id if update.effective_user else "unknown"
@@ -114,33 +126,19 @@ async def news(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = _reply_target(update)
 
     try:
-        category = _get_category_cycle(int(user_id) if user_id != "unknown" else 0)
-
-        if category == "crypto":
-            feeds = CRYPTO_NEWS
-            emoji = "💰"
-            title = "Cryptocurrency News"
-        else:
-            feeds = MARKET_NEWS
-            emoji = "📈"
-            title = "Market and Finance News"
-
-        result = None
-        for url in feeds:
-            result = _fetch_one(url)
-            if result:
-                break
-
-        if not result:
-            scope = (getattr(SETTINGS, "TELEGRAM_SCOPE", None) or "all").lower()
-            fallback_feeds = REGIONAL_FEEDS.get(scope, [])
-            for url in fallback_feeds:
-                result = _fetch_one(url)
-                if result:
-                    break
-
-        if not result:
+        uid = int(user_id) if user_id != "unknown" else 0
+        category = _get_category_cycle(uid)
+        categories = _categories(category)
+
+        # Served from the item index; only a cold feed cache goes to the network
+        hit = _index.next_unseen(uid, *categories)
+        if hit is None:
+            await feed_cache.first_item([url for c in categories for url in NEWS_CATEGORIES[c]])
+            hit = _index.next_unseen(uid, *categories)
+
+        if not hit:
             if msg:
+                title = CATEGORY_TITLES[category][1]
                 await msg.reply_text(
                     f"⚠️ Could not fetch {title.lower()} right now.\n\nTry again in a few moments.",
                     parse_mode="Markdown",
@@ -148,27 +146,52 @@ async def news(update: Update, context: ContextTypes.DEFAULT_TYPE):
             logger.warning("Could not fetch any news for category %s", category)
             return
 
-        chan_title, article_title, link = result
-
-        message = f"""
-{emoji} **{title}**
-
-**{article_title}**
-
-📰 Source: {chan_title}
-🔗 [Read more]({link})
-
---------------------
-*Call `/news` again for the next category*
-*Categories rotate: Crypto → Markets*
-"""
-
+        position, shown_category, item = hit
         if msg:
-            await msg.reply_text(message, parse_mode="Markdown")
+            await msg.reply_text(
+                _render(shown_category, item),
+                parse_mode="Markdown",
+                reply_markup=_keyboard(shown_category, position),
+            )
 
-        logger.info("Sent %s news to user %s: %s", category, user_id, article_title[:80])
+        logger.info("Sent %s news to user %s: %s", shown_category, user_id, item.title[:80])
 
     except Exception as e:
         logger.exception("Error in news command: %s", e)
         if msg:
             await msg.reply_text("⚠️ Error fetching news. Try again later.", parse_mode="Markdown")
+
+
+async def news_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Inline next/prev paging, answered from the item index (never refetches)."""
+    query = update.callback_query
+    try:
+        _, action, category, position = query.data.split(":")
+        position = int(position)
+    except ValueError:
+        await query.answer()
+        return
+    if category not in NEWS_CATEGORIES:
+        await query.answer()
+        return
+
+    hit = _index.page(query.from_user.id, position, -1 if action == "p" else 1, *_categories(category))
+    if hit is None:
+        await query.answer("No earlier headlines." if action == "p" else "No more headlines right now.")
+        return
+
+    await query.answer()
+    position, shown_category, item = hit
+    try:
+        await query.edit_message_text(
+            _render(shown_category, item),
+            parse_mode="Markdown",
+            reply_markup=_keyboard(shown_category, position),
+        )
+    except BadRequest as e:
+        # e.g. "message is not modified" when the only headline is shown again
+        logger.debug("Could not page news message: %s", e)
+
+
+def index_stats() -> dict:
+    return _index.stats()
@@ -29,6 +29,9 @@ Bot health, scheduler status, price anchor, and next 4:20 ritual
 📰 **/news**
 Rotating market news (crypto → finance)
 
+🔬 **/studies**
+Cannabis research & health awareness digest
+
 🩺 **/health**
 Quick bot health check
 
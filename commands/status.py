@@ -2,7 +2,12 @@ import os
 import logging
 import datetime as dt
 from services.ritual import kiss_anchor
+from services.dexscreener import cache_stats, negative_cache_stats, upstream_stats
 from services.navigator_blessing import get_blessing
+from services.ritual_time import drift_tracker
+from services.feeds import feed_cache
+from services.outbox import outbox
+from commands.news import index_stats, rotation_stats
 
 logger = logging.getLogger(__name__)
 
@@ -134,15 +139,48 @@ async def status(update, context):
 
     try:
         token = os.getenv("DEFAULT_TOKEN", "weedcoin").lower()
-        anchor = kiss_anchor(token)
+        anchor = await kiss_anchor(token)
 
         sched_name, total_jobs, hub_jobs = _count_jobs(context)
         next_sched_name, hub_id, nxt = _next_ritual(context)
 
         now = dt.datetime.now(dt.timezone.utc)
         nxt_txt = f"{nxt:%H:%M} UTC (in {_fmt_delta(nxt - now)})" if nxt else "Not scheduled"
+        ds = drift_tracker.stats()
+        drift_txt = (
+            f"p50 {ds['p50']:.2f}s / max {ds['max']:.2f}s over {ds['timezones']} timezones"
+            if ds["p50"] is not None else "no rituals sent yet"
+        )
         hub_txt = f" | {hub_id}" if hub_id else ""
 
+        cs = cache_stats()
+        neg = negative_cache_stats()
+        cache_txt = (
+            f"{cs['hits']} hits / {cs['stale']} stale / {cs['misses']} misses ({cs['size']}/{cs['maxsize']})"
+            f" | not-found: {neg['hits']} hits ({neg['size']}/{neg['maxsize']})"
+        )
+        upstream_txt = f"DexScreener circuit {upstream_stats()['state'].replace('_', '-')}"
+        fs = feed_cache.stats()
+        ix = index_stats()
+        feeds_txt = (
+            f"{fs['feeds']}/{fs['watched']} cached, "
+            f"{fs['not_modified']}/{fs['fetches'] + fs['not_modified']} not modified, "
+            f"{ix['items']} items indexed ({ix['duplicates']} duplicates)"
+        )
+        rs = rotation_stats()
+        rotation_txt = (
+            f"{rs['size']}/{rs['maxsize']} users, "
+            f"{rs['lru_evictions'] + rs['idle_evictions']} evicted ({rs['eviction_rate']:.1%} of calls)"
+        )
+
+        ob = outbox.stats()
+        waits = " / ".join(
+            f"{name} p95 {w['p95']:.2f}s" for name, w in ob["wait"].items() if w["p95"] is not None
+        ) or "no waits yet"
+        outbox_txt = (
+            f"{sum(ob['depth'].values())} queued, {ob['sent']} sent, {ob['retried']} rescheduled | {waits}"
+        )
+
         blessing = get_blessing()
 
         message = f"""
@@ -151,6 +189,7 @@ async def status(update, context):
 
 🟢 **BOT HEALTH**
 Status: Online ✅
+Outbox: {outbox_txt}
 
 🕰 **SCHEDULER**
 Engine: {sched_name}
@@ -159,11 +198,16 @@ Jobs scheduled: {hub_jobs} hub jobs (total {total_jobs})
 📊 **PRICE ANCHOR**
 Token: {token.upper()}
 {anchor}
+Cache: {cache_txt}
+Upstream: {upstream_txt}
+News feeds: {feeds_txt}
+News rotation: {rotation_txt}
 
 📅 **NEXT RITUAL**
 Engine: {next_sched_name}
 Time: {nxt_txt}{hub_txt}
 Frequency: Daily (04:20 local per timezone, rolling global)
+Delivery drift: {drift_txt}
 
 ----------------------------------------
 **✨ Navigator's Blessing ✨**
@@ -1,12 +1,18 @@
-import xml.etree.ElementTree as ET
-import requests
+import time
 import random
+import asyncio
 import logging
 from telegram import Update
 from telegram.ext import ContextTypes
+from services.feeds import FeedCache
+from services.storage import get_store
 
 logger = logging.getLogger(__name__)
 
+DIGEST_KEY = "studies:digest"
+DIGEST_INTERVAL_HOURS = 6
+DIGEST_SIZE = 12  # articles kept in the digest
+
 # Educational RSS feeds on cannabis research, health, nutrition, sustainability
 STUDY_FEEDS = [
     "https://www.ncbi.nlm.nih.gov/research/cannabinoid/",
@@ -35,56 +41,64 @@ FALLBACK_RESOURCES = [
     },
 ]
 
-def _fetch_study(url: str):
-    """Fetch a study/article from an RSS feed."""
-    try:
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        root = ET.fromstring(r.content)
-        item = root.find(".//item")
-        if item is None:
-            logger.debug(f"No items in study feed: {url}")
-            return None
-        title = (item.findtext("title") or "").strip()
-        link = (item.findtext("link") or "").strip()
-        description = (item.findtext("description") or "").strip()[:100]
-        if not title or not link:
-            logger.debug(f"Invalid item in study feed: {url}")
-            return None
-        return title, link, description
-    except requests.Timeout:
-        logger.warning(f"Timeout fetching study feed: {url}")
-        return None
-    except requests.RequestException as e:
-        logger.warning(f"Request error fetching study feed {url}: {e}")
-        return None
-    except ET.ParseError as e:
-        logger.warning(f"XML parse error in study feed {url}: {e}")
-        return None
-    except Exception as e:
-        logger.exception(f"Unexpected error fetching study feed {url}: {e}")
-        return None
+# Conditional GETs between digest builds; feeds that are HTML pages simply yield nothing
+_study_feeds = FeedCache()
+_digest = None
+
+
+def load_digest():
+    """The current digest ({"built": ts, "items": [...]}), read from the local store once."""
+    global _digest
+    if _digest is None:
+        try:
+            _digest = get_store().get(DIGEST_KEY) or {"built": 0, "items": []}
+        except Exception as e:
+            logger.warning(f"Could not load study digest: {e}")
+            _digest = {"built": 0, "items": []}
+    return _digest
+
+
+async def refresh_study_digest():
+    """Scheduled job: fetch STUDY_FEEDS concurrently and store a fresh digest locally."""
+    global _digest
+    entries = await asyncio.gather(*(_study_feeds.fetch(url) for url in STUDY_FEEDS))
+    items, links = [], set()
+    for entry in entries:
+        for item in entry.items if entry is not None else ():
+            if item.link in links:
+                continue
+            links.add(item.link)
+            items.append({"title": item.title, "link": item.link, "summary": item.summary[:100], "source": item.channel})
+    if not items:
+        # Keep serving the previous digest rather than replacing it with nothing
+        logger.warning(f"Study digest refresh found no articles ({len(STUDY_FEEDS)} feeds)")
+        return
+    digest = {"built": time.time(), "items": items[:DIGEST_SIZE]}
+    await asyncio.get_running_loop().run_in_executor(None, get_store().set, DIGEST_KEY, digest)
+    _digest = digest
+    logger.info(f"Study digest rebuilt: {len(digest['items'])} articles")
+
 
 async def studies(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Fetch and send cannabis research & health awareness content."""
+    """Send cannabis research & health awareness content from the precomputed digest."""
     user_id = update.effective_user.id
     logger.info(f"Studies command requested (user: {user_id})")
-    
-    # Try to fetch from research feeds
-    for url in STUDY_FEEDS:
-        hit = _fetch_study(url)
-        if hit:
-            title, link, desc = hit
-            lines = [
-                "🔬 Cannabis Research & Awareness",
-                "────────────────────────",
-                f"• {title}",
-                f"📖 {desc}..." if desc else "",
-                f"🔗 {link}",
-            ]
-            logger.info(f"Sent study article (user: {user_id})")
-            await update.message.reply_text("\n".join(filter(None, lines)))
-            return
+
+    # Answer from the digest; the network is only touched by refresh_study_digest
+    items = load_digest()["items"]
+    if items:
+        study = random.choice(items)
+        desc = study.get("summary")
+        lines = [
+            "🔬 Cannabis Research & Awareness",
+            "────────────────────────",
+            f"• {study['title']}",
+            f"📖 {desc}..." if desc else "",
+            f"🔗 {study['link']}",
+        ]
+        logger.info(f"Sent study article (user: {user_id})")
+        await update.message.reply_text("\n".join(filter(None, lines)))
+        return
 
     # Fallback: rotate through curated resources
     resource = random.choice(FALLBACK_RESOURCES)
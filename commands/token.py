@@ -2,10 +2,16 @@ import logging
 import os
 from telegram import Update
 from telegram.ext import ContextTypes
-from services.dexscreener import get_anchor
+from services.quotes import get_quote, quote_to_anchor
+from services.dexscreener import get_aggregate_anchor
 
 logger = logging.getLogger(__name__)
 
+# `/token <symbol> agg` shows the volume/liquidity-weighted price across all pairs
+AGGREGATE_MODES = {"agg", "all", "aggregate"}
+# `/token <symbol> check` waits for every price provider and compares them
+RECONCILE_MODES = {"check", "compare", "verify"}
+
 
 def _reply_target(update: Update):
     # Always prefer effective_message; update.message can be None in some contexts.
@@ -36,10 +42,19 @@ async def token(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         token_symbol = os.getenv("DEFAULT_TOKEN", "weedcoin").lower()
 
-    logger.info("Token price query for: %s (user: %s)", token_symbol, user_id)
+    mode = context.args[1].strip().lower() if context.args and len(context.args) > 1 else ""
+    aggregate = mode in AGGREGATE_MODES
+    reconcile = mode in RECONCILE_MODES
+
+    logger.info("Token price query for: %s%s (user: %s)", token_symbol, " [agg]" if aggregate else "", user_id)
 
     try:
-        anchor = get_anchor(token_symbol)
+        if aggregate:
+            anchor = await get_aggregate_anchor(token_symbol)
+        else:
+            # DexScreener + CoinGecko in parallel: first valid answer, unless asked to compare
+            quote = await get_quote(token_symbol, reconcile=reconcile)
+            anchor = quote_to_anchor(quote) if quote else None
 
         if not anchor:
             if msg:
@@ -55,7 +70,13 @@ async def token(update: Update, context: ContextTypes.DEFAULT_TYPE):
         price = anchor.get("price", "?")
         change24 = anchor.get("change24", "+/-0.00%")
         vol24 = anchor.get("vol24", "$0")
-        dex = (anchor.get("dex", "") or "").upper()
+        dex = (anchor.get("dex", "") or "").upper() or "N/A"
+        sources = " + ".join(anchor.get("sources") or []) or "dexscreener"
+        if anchor.get("divergent"):
+            sources += f" ⚠️ providers differ by {anchor.get('spread', 0) * 100:.1f}%"
+        if aggregate:
+            dex = f"{anchor.get('pairs', 1)} pairs ({anchor.get('chain') or 'n/a'})"
+            sources = "dexscreener, volume/liquidity-weighted"
 
         message = f"""
 💰 **{symbol}** Price
@@ -70,9 +91,11 @@ async def token(update: Update, context: ContextTypes.DEFAULT_TYPE):
 {vol24}
 
 🏪 **Exchange**: {dex}
+🔎 **Sources**: {sources}
 
 --------------------
 *Run `/token` again for fresh data*
+*Add `agg` for a cross-pair average, `check` to compare providers*
 *Use `/news` for market updates*
 """
 
@@ -3,10 +3,11 @@ import json
 import pytz
 import datetime as dt
 import logging
-import asyncio
 import inspect
 from types import SimpleNamespace
 
+from services.ritual_time import PREPARE_LEAD, RITUAL_TIME
+
 logger = logging.getLogger(__name__)
 
 # scheduler.py lives at project root
@@ -16,6 +17,15 @@ PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 HUBS_PATH = os.path.join(PROJECT_ROOT, "media", "hubs.json")
 
 JOB_PREFIX = "hub420:"
+PREPARE_PREFIX = "hub420prep:"
+
+MISFIRE_GRACE = 300  # a ritual delayed by a busy loop is still sent, up to 5 minutes late
+
+
+def _prepare_time() -> dt.time:
+    """RITUAL_TIME minus PREPARE_LEAD (04:19:00)."""
+    start = dt.datetime.combine(dt.date(2024, 1, 1), RITUAL_TIME)
+    return (start - dt.timedelta(seconds=PREPARE_LEAD)).time()
 
 
 def load_hubs():
@@ -52,10 +62,13 @@ def _build_ptb_context(app, data: dict):
     )
 
 
-def schedule_hubs(scheduler_or_jobqueue, callback, app=None):
+def schedule_hubs(scheduler_or_jobqueue, callback, app=None, prepare=None):
     """
     Schedule ONE 4:20 per timezone.
     At runtime, ritual_call chooses which HUB and which CITY speaks.
+
+    If `prepare` is given it runs PREPARE_LEAD seconds earlier in the same
+    timezone (job ids `hub420prep:<tz>`), so the 04:20:00 job only sends.
     """
     hubs = load_hubs()
 
@@ -95,11 +108,18 @@ def schedule_hubs(scheduler_or_jobqueue, callback, app=None):
         job_name = f"{JOB_PREFIX}{tz_name}"
 
         if is_ptb_jobqueue:
-            t420 = dt.time(hour=4, minute=20)
+            if prepare is not None:
+                scheduler_or_jobqueue.run_daily(
+                    prepare,
+                    time=_prepare_time(),
+                    timezone=tz,
+                    name=f"{PREPARE_PREFIX}{tz_name}",
+                    data=payload,
+                )
 
             job = scheduler_or_jobqueue.run_daily(
                 callback,
-                time=t420,
+                time=RITUAL_TIME,
                 timezone=tz,
                 name=job_name,
                 data=payload,
@@ -117,26 +137,34 @@ def schedule_hubs(scheduler_or_jobqueue, callback, app=None):
         # APScheduler path
         from apscheduler.triggers.cron import CronTrigger
 
-        async def _run(payload=payload):
+        # Coroutine jobs run directly on the bot's event loop (AsyncIOExecutor),
+        # so the send starts on the 04:20:00 tick with no thread/loop hop
+        async def _run(payload=payload, fn=callback):
             ctx = _build_ptb_context(app, payload)
-            if inspect.iscoroutinefunction(callback):
-                await callback(ctx)
+            if inspect.iscoroutinefunction(fn):
+                await fn(ctx)
             else:
-                callback(ctx)
-
-        def _fire():
-            try:
-                loop = asyncio.get_running_loop()
-                loop.create_task(_run())
-            except RuntimeError:
-                asyncio.run(_run())
+                fn(ctx)
+
+        if prepare is not None:
+            prep = _prepare_time()
+            scheduler_or_jobqueue.add_job(
+                _run,
+                CronTrigger(hour=prep.hour, minute=prep.minute, second=prep.second, timezone=tz),
+                kwargs={"fn": prepare},
+                id=f"{PREPARE_PREFIX}{tz_name}",
+                name=f"{PREPARE_PREFIX}{tz_name}",
+                replace_existing=True,
+                misfire_grace_time=PREPARE_LEAD,
+            )
 
         job = scheduler_or_jobqueue.add_job(
-            _fire,
-            CronTrigger(hour=4, minute=20, timezone=tz),
+            _run,
+            CronTrigger(hour=RITUAL_TIME.hour, minute=RITUAL_TIME.minute, second=0, timezone=tz),
             id=job_name,
             name=job_name,
             replace_existing=True,
+            misfire_grace_time=MISFIRE_GRACE,
         )
 
         logger.info(
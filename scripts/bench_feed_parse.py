@@ -0,0 +1,73 @@
+"""
+Benchmark feed parsing: legacy full ET.fromstring tree vs. the streaming
+FeedParser that stops after the first K items.
+
+Runs over the saved fixtures in tests/fixtures/feeds/ plus any extra feed
+files given on the command line (e.g. curl'd copies of real feeds).
+
+Usage: python scripts/bench_feed_parse.py [iterations] [feed.xml ...]
+"""
+import os
+import sys
+import gc
+import glob
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.feeds import parse_items  # noqa: E402
+
+FIXTURES = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "feeds"))
+
+
+def legacy_first(body: bytes):
+    """The previous implementation: build the whole tree, read one RSS <item> (Atom unsupported)."""
+    root = ET.fromstring(body)
+    channel = root.find("./channel")
+    if channel is None:
+        return None
+    item = channel.find("item")
+    return None if item is None else (item.findtext("title"), item.findtext("link"))
+
+
+def time_per_call(fn, body: bytes, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(body)
+    return (time.perf_counter() - start) / iterations * 1e3
+
+
+def peak_bytes(fn, body: bytes) -> float:
+    """Peak allocation while parsing one document (the body itself excluded)."""
+    gc.collect()
+    tracemalloc.start()
+    fn(body)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    paths = sys.argv[2:] or sorted(glob.glob(os.path.join(FIXTURES, "*.xml")))
+
+    parsers = [
+        ("legacy", legacy_first),
+        ("stream K=1", lambda b: parse_items(b, limit=1)),
+        ("stream K=10", lambda b: parse_items(b, limit=10)),
+    ]
+    for path in paths:
+        with open(path, "rb") as f:
+            body = f.read()
+        first = parse_items(body, limit=1)
+        print(f"\n{os.path.basename(path)}: {len(body) / 1024:.1f} KiB, {iterations} iterations")
+        print(f"  first item: {first[0].title[:60] if first else None!r} (legacy: {'ok' if legacy_first(body) else 'unsupported'})")
+        print(f"  {'':14}{'ms/doc':>10}{'peak KiB':>12}")
+        for label, fn in parsers:
+            print(f"  {label:14}{time_per_call(fn, body, iterations):>10.3f}{peak_bytes(fn, body) / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
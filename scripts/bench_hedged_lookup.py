@@ -0,0 +1,118 @@
+"""
+Measure /token <symbol> lookup latency with sequential token→search
+fallback vs. hedged token+search, against a local DexScreener stub.
+
+The stub's token endpoint never finds symbols (like the real API) and has a
+slow tail; search answers in ~150 ms.
+
+Usage: python scripts/bench_hedged_lookup.py [lookups] [slow_fraction]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services import dexscreener, http_client  # noqa: E402
+from services.history import PriceHistory  # noqa: E402
+from services.pair_index import PairIndex  # noqa: E402
+
+TOKEN_FAST, TOKEN_SLOW, SEARCH_LATENCY = 0.12, 1.5, 0.15
+
+
+def make_handler(slow_fraction: float, seed: int = 420):
+    rnd = random.Random(seed)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                jitter = rnd.uniform(0.8, 1.2)
+                slow = rnd.random() < slow_fraction
+            if "/tokens/" in self.path:
+                time.sleep((TOKEN_SLOW if slow else TOKEN_FAST) * jitter)
+                body = {"schemaVersion": "1.0.0", "pairs": None}
+            else:
+                time.sleep(SEARCH_LATENCY * jitter)
+                q = self.path.rsplit("=", 1)[-1]
+                body = {"pairs": [{
+                    "chainId": "solana", "dexId": "raydium", "pairAddress": f"{q}-pair",
+                    "baseToken": {"symbol": q.upper()}, "priceUsd": "0.0042",
+                    "priceChange": {"h24": 4.2}, "volume": {"h24": 42000},
+                }]}
+            data = json.dumps(body).encode()
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the hedged loser was cancelled client-side
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_mode(hedged: bool, lookups: int, concurrency: int = 8):
+    dexscreener.HEDGE_ENABLED = hedged
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with sem:
+            started = time.perf_counter()
+            anchor = await dexscreener.get_anchor(f"{'hedged' if hedged else 'seq'}{i}")
+            latencies.append(time.perf_counter() - started)
+            assert anchor, "lookup failed"
+
+    try:
+        await asyncio.gather(*(one(i) for i in range(lookups)))
+    finally:
+        await http_client.aclose()
+    return latencies
+
+
+def main():
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    slow_fraction = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(slow_fraction))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    dexscreener.DEX_URL_TOKEN = base + "/latest/dex/tokens/{id}"
+    dexscreener.DEX_URL_SEARCH = base + "/latest/dex/search?q={q}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dexscreener._pair_index = PairIndex(os.path.join(tmp, "pair_index.json"))
+        # Every resolved quote is recorded; keep the stub's tokens out of data/history
+        dexscreener.price_history = PriceHistory(os.path.join(tmp, "history"))
+        print(f"{lookups} symbol lookups, token endpoint slow {slow_fraction:.0%} of the time "
+              f"({TOKEN_FAST * 1000:.0f} ms / {TOKEN_SLOW * 1000:.0f} ms), search {SEARCH_LATENCY * 1000:.0f} ms, "
+              f"hedge delay {dexscreener.HEDGE_DELAY * 1000:.0f} ms")
+        print(f"{'mode':12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for hedged in (False, True):
+            lat = asyncio.run(run_mode(hedged, lookups))
+            row = [percentile(lat, p) * 1000 for p in (50, 95, 99)] + [max(lat) * 1000]
+            print(f"{'hedged' if hedged else 'sequential':12}" + "".join(f"{v:>10.0f}" for v in row))
+        dexscreener.price_history.close()
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
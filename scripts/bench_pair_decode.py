@@ -0,0 +1,101 @@
+"""
+Benchmark DexScreener pair selection/decoding: legacy full sort + raw dict
+vs. single-pass selection into a compact Pair record.
+
+Usage: python scripts/bench_pair_decode.py [pairs_per_response] [iterations]
+"""
+import os
+import sys
+import gc
+import json
+import time
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.dexscreener import _pick_pair  # noqa: E402
+
+
+def make_pair(i: int) -> dict:
+    """A pair dict shaped like a real DexScreener search result."""
+    rnd = random.Random(i)
+    return {
+        "chainId": rnd.choice(["solana", "ethereum", "bsc", "base"]),
+        "dexId": rnd.choice(["raydium", "orca", "uniswap", "pancakeswap"]),
+        "url": f"https://dexscreener.com/solana/pair{i}",
+        "pairAddress": f"Pair{i:040d}",
+        "labels": ["v2"],
+        "baseToken": {"address": f"Base{i:040d}", "name": "Weedcoin", "symbol": "WEEDCOIN"},
+        "quoteToken": {"address": f"Quote{i:039d}", "name": "Wrapped SOL", "symbol": "SOL"},
+        "priceNative": f"{rnd.random():.10f}",
+        "priceUsd": f"{rnd.random():.8f}",
+        "txns": {k: {"buys": rnd.randint(0, 500), "sells": rnd.randint(0, 500)} for k in ("m5", "h1", "h6", "h24")},
+        "volume": {k: round(rnd.random() * 1e6, 2) for k in ("m5", "h1", "h6", "h24")},
+        "priceChange": {k: round(rnd.uniform(-50, 50), 2) for k in ("m5", "h1", "h6", "h24")},
+        "liquidity": {"usd": round(rnd.random() * 1e6, 2), "base": rnd.random() * 1e9, "quote": rnd.random() * 1e4},
+        "fdv": rnd.randint(100_000, 1_000_000_000),
+        "marketCap": rnd.randint(100_000, 1_000_000_000),
+        "pairCreatedAt": 1700000000000 + i,
+        "info": {
+            "imageUrl": f"https://cdn.dexscreener.com/{i}.png",
+            "websites": [{"label": "Website", "url": "https://example.org"}],
+            "socials": [{"type": "twitter", "url": "https://x.com/example"}],
+        },
+    }
+
+
+def legacy_pick(payload):
+    """The previous implementation: full sort re-parsing volume, raw dict retained."""
+    pairs = (payload or {}).get("pairs") or []
+    return sorted(pairs, key=lambda p: float(p.get("volume", {}).get("h24") or 0), reverse=True)[0]
+
+
+def time_per_call(fn, body: bytes, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(json.loads(body))
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def time_select(fn, payload: dict, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(payload)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def retained_bytes(fn, body: bytes, keep: int = 200) -> float:
+    """Bytes still allocated per response after the payload is dropped and only the result is kept."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [fn(json.loads(body)) for _ in range(keep)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(kept) == keep
+    return (after - before) / keep
+
+
+def main():
+    n_pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    body = json.dumps({"schemaVersion": "1.0.0", "pairs": [make_pair(i) for i in range(n_pairs)]}).encode()
+
+    decoded = json.loads(body)
+    assert legacy_pick(decoded)["pairAddress"] == _pick_pair(decoded).pair_address
+
+    print(f"Response: {n_pairs} pairs, {len(body) / 1024:.1f} KiB, {iterations} iterations")
+    print(f"{'':28}{'legacy':>12}{'compact':>12}")
+    rows = [
+        ("decode+select (us/resp)", time_per_call(legacy_pick, body, iterations), time_per_call(_pick_pair, body, iterations)),
+        ("select only (us/resp)", time_select(legacy_pick, decoded, iterations), time_select(_pick_pair, decoded, iterations)),
+        ("retained (bytes/resp)", retained_bytes(legacy_pick, body), retained_bytes(_pick_pair, body)),
+    ]
+    for label, before, after in rows:
+        print(f"{label:28}{before:>12.1f}{after:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ import requests
 COINGECKO_COIN_URL = "https://api.coingecko.com/api/v3/coins/{}"
 DEX_SEARCH_URL = "https://api.dexscreener.com/latest/dex/search?q={}"
 DEX_TOKEN_URL = "https://api.dexscreener.com/latest/dex/tokens/{}"
+DEX_BATCH_SIZE = 30  # DexScreener accepts up to 30 comma-separated addresses
 
 
 def load_tokens(path: str):
@@ -46,6 +47,43 @@ def check_dex_token(mint: str):
     return False, {"pairs": 0, "url": url}
 
 
+def check_dex_tokens(mints):
+    """
+    Validate many mints with as few DexScreener calls as possible.
+    Returns {mint: (ok, info)} with the same shape as check_dex_token.
+    """
+    results = {}
+    mints = list(dict.fromkeys(m for m in mints if m))
+    for i in range(0, len(mints), DEX_BATCH_SIZE):
+        chunk = mints[i:i + DEX_BATCH_SIZE]
+        url = DEX_TOKEN_URL.format(",".join(chunk))
+        r = requests.get(url, timeout=15, headers={"User-Agent": "Toka420Bot/1.0"})
+        if r.status_code != 200:
+            for m in chunk:
+                results[m] = (False, {"status_code": r.status_code, "url": url})
+            continue
+
+        # Split the combined pairs back per base token address
+        by_base = {}
+        for p in r.json().get("pairs") or []:
+            addr = ((p.get("baseToken") or {}).get("address") or "").lower()
+            by_base.setdefault(addr, []).append(p)
+
+        for m in chunk:
+            pairs = by_base.get(m.lower()) or []
+            if pairs:
+                top = pairs[0]
+                results[m] = (True, {
+                    "pairs": len(pairs),
+                    "chainId": top.get("chainId"),
+                    "dexId": top.get("dexId"),
+                    "pairAddress": top.get("pairAddress"),
+                })
+            else:
+                results[m] = (False, {"pairs": 0, "url": DEX_TOKEN_URL.format(m)})
+    return results
+
+
 def search_dex(symbol_or_name: str):
     url = DEX_SEARCH_URL.format(symbol_or_name)
     r = requests.get(url, timeout=15, headers={"User-Agent": "Toka420Bot/1.0"})
@@ -77,6 +115,13 @@ def main():
     report = []
     ok_count = 0
 
+    # Resolve every Solana mint (without a CoinGecko id) up front in batched calls
+    dex_results = check_dex_tokens(
+        t.get("mint")
+        for t in tokens
+        if not t.get("coingecko_id") and (t.get("chain") or "").lower() == "solana"
+    )
+
     for t in tokens:
         symbol = t.get("symbol")
         name = t.get("name")
@@ -100,7 +145,7 @@ def main():
 
         # Priority 2: Solana mint via DexScreener
         if chain == "solana" and mint:
-            ok, info = check_dex_token(mint)
+            ok, info = dex_results.get(mint) or check_dex_token(mint)
             item["mint"] = mint
             item["dex_ok"] = ok
             item["dex_info"] = info
@@ -0,0 +1,135 @@
+"""
+Ritual fan-out — chat targets with per-chat overrides, delivered
+concurrently through the prioritized outbound queue.
+"""
+import os
+import json
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from telegram.error import TelegramError
+
+from services.outbox import PRIORITY_RITUAL
+
+logger = logging.getLogger(__name__)
+
+CHATS_PATH = os.getenv(
+    "CHAT_OVERRIDES_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "media", "chats.json")),
+)
+SEND_CONCURRENCY = 50
+
+# Middle East timezones filed under Asia/ that belong to EMEA
+_EMEA_ASIA = {
+    "Asia/Dubai", "Asia/Riyadh", "Asia/Qatar", "Asia/Bahrain", "Asia/Kuwait", "Asia/Muscat",
+    "Asia/Jerusalem", "Asia/Tel_Aviv", "Asia/Beirut", "Asia/Amman", "Asia/Baghdad", "Asia/Tehran",
+}
+
+
+def tz_region(tz_name: str) -> str:
+    """Map an IANA timezone to the TELEGRAM_SCOPE regions (amer | emea | apac)."""
+    area = tz_name.split("/", 1)[0]
+    if area == "America":
+        return "amer"
+    if area in ("Europe", "Africa", "Atlantic") or tz_name in _EMEA_ASIA:
+        return "emea"
+    return "apac"
+
+
+@dataclass(frozen=True)
+class ChatTarget:
+    """One ritual destination; unset overrides fall back to the global defaults."""
+    chat_id: str
+    token: Optional[str] = None
+    scope: str = "all"
+    timezones: Optional[FrozenSet[str]] = None  # explicit allow-list, takes precedence over scope
+
+    def wants(self, tz_name: str) -> bool:
+        if self.timezones is not None:
+            return tz_name in self.timezones
+        return self.scope == "all" or tz_region(tz_name) == self.scope
+
+
+def _load_overrides(path: str) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error("Invalid chat overrides in %s: %s", path, e)
+        return {}
+    if not isinstance(data, dict):
+        logger.error("Chat overrides in %s must be an object keyed by chat id", path)
+        return {}
+    return {str(k): v for k, v in data.items() if isinstance(v, dict)}
+
+
+def load_targets(chat_ids: Optional[Iterable[str]] = None, path: str = CHATS_PATH) -> List[ChatTarget]:
+    """
+    Ritual chats: TELEGRAM_GLOBAL_CHAT_ID, then CHAT_IDS, then any extra chat
+    listed in the overrides file, each with its overrides applied, e.g.
+    {"-1001": {"token": "bonk", "scope": "apac", "timezones": ["Asia/Tokyo"]}}.
+    """
+    if chat_ids is None:
+        # Read at call time: SETTINGS is frozen before main() loads .env
+        chat_ids = [os.getenv("TELEGRAM_GLOBAL_CHAT_ID", "")] + os.getenv("CHAT_IDS", "").split(",")
+    overrides = _load_overrides(path)
+    ids = [c.strip() for c in chat_ids if c and c.strip()]
+    default_scope = (os.getenv("TELEGRAM_SCOPE") or "all").lower()
+
+    targets = []
+    for chat_id in dict.fromkeys(ids + list(overrides)):
+        o = overrides.get(chat_id, {})
+        if o.get("enabled", True) is False:
+            continue
+        timezones = o.get("timezones")
+        targets.append(ChatTarget(
+            chat_id=chat_id,
+            token=(o.get("token") or "").strip() or None,
+            scope=(o.get("scope") or default_scope).lower(),
+            timezones=frozenset(timezones) if isinstance(timezones, list) else None,
+        ))
+    return targets
+
+
+class Broadcaster:
+    """
+    Concurrent ritual sender on top of the outbound queue (services.outbox).
+
+    Sends are tagged PRIORITY_RITUAL, so they overtake queued command replies;
+    global and per-chat pacing and RetryAfter rescheduling happen in the
+    queue. Any Telegram error that survives it fails that chat only.
+    """
+
+    def __init__(self, concurrency: int = SEND_CONCURRENCY):
+        self._sem = asyncio.Semaphore(concurrency)
+        self._chats: Set[str] = set()
+        self.sent = 0
+        self.failed = 0
+
+    async def send(self, bot, chat_id: str, text: str) -> bool:
+        self._chats.add(chat_id)
+        async with self._sem:
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, rate_limit_args={"priority": PRIORITY_RITUAL})
+                self.sent += 1
+                return True
+            except TelegramError as e:
+                logger.warning("Ritual send to chat %s failed: %s", chat_id, e)
+                self.failed += 1
+                return False
+
+    async def fan_out(self, bot, deliveries: List[Tuple[str, str]]) -> Dict[str, int]:
+        """Send each (chat_id, text) concurrently; returns sent/failed counts."""
+        results = await asyncio.gather(*(self.send(bot, chat_id, text) for chat_id, text in deliveries))
+        sent = sum(results)
+        return {"sent": sent, "failed": len(results) - sent}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sent": self.sent, "failed": self.failed, "chats": len(self._chats)}
+
+
+broadcaster = Broadcaster()
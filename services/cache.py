@@ -0,0 +1,117 @@
+"""
+Bounded in-memory cache with per-entry TTL, LRU eviction and a
+stale-while-revalidate window.
+"""
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FRESH = "fresh"
+STALE = "stale"
+MISS = "miss"
+
+
+class TTLCache:
+    """
+    LRU cache whose entries expire after `ttl` seconds.
+
+    Between `ttl` and `ttl + stale_ttl` an entry is still returned, flagged
+    STALE, so callers can serve it immediately and refresh in the background.
+    Older entries are dropped and reported as a MISS.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60, stale_ttl: float = 0, name: str = "cache"):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, Tuple[Any, float, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def lookup(self, key: Hashable, now: Optional[float] = None) -> Tuple[str, Any]:
+        """Return (state, value) where state is FRESH, STALE or MISS."""
+        now = time.time() if now is None else now
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISS, None
+
+        value, ts, ttl = entry
+        age = now - ts
+        if age < ttl:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return FRESH, value
+        if age < ttl + self.stale_ttl:
+            self._data.move_to_end(key)
+            self.stale += 1
+            return STALE, value
+
+        del self._data[key]
+        self.misses += 1
+        return MISS, None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a fresh value or `default` (stale entries count as misses here)."""
+        state, value = self.lookup(key)
+        return value if state == FRESH else default
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Return any stored value regardless of age, without touching stats or LRU order."""
+        entry = self._data.get(key)
+        return entry[0] if entry is not None else default
+
+    def expires_in(self, key: Hashable, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until the entry stops being fresh (negative once stale, None if absent)."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        now = time.time() if now is None else now
+        _, ts, ttl = entry
+        return ts + ttl - now
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        self._data[key] = (value, now, self.ttl if ttl is None else ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            evicted, _ = self._data.popitem(last=False)
+            self.evictions += 1
+            logger.debug("%s evicted %s", self.name, evicted)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def reset_stats(self) -> None:
+        self.hits = self.misses = self.stale = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.stale) / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,107 @@
+"""
+Circuit breaker and latency-adaptive timeouts for upstream HTTP APIs.
+"""
+import time
+import math
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds. Then lets exactly one probe through
+    (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30,
+                 name: str = "circuit", clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self._clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Return True if a call may proceed now."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self._clock() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self._probe_in_flight = False
+            logger.info("%s half-open, sending probe", self.name)
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info("%s closed after successful probe", self.name)
+        self.state = CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_cancel(self) -> None:
+        """A call was cancelled before completing; free the probe slot without judging."""
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning("%s open after %d consecutive failures", self.name, self.failures)
+            self.state = OPEN
+            self.opened_at = self._clock()
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+class AdaptiveTimeout:
+    """
+    Per-endpoint timeout derived from observed latency: `factor` × p95 of
+    the last `window` samples, clamped to [min_timeout, max_timeout].
+    Until `min_samples` are seen, `max_timeout` is used.
+    """
+
+    def __init__(self, min_timeout: float = 1.5, max_timeout: float = 10, factor: float = 2.0,
+                 window: int = 50, min_samples: int = 10):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.factor = factor
+        self.min_samples = min_samples
+        self._samples: deque = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+
+    @property
+    def timeout(self) -> float:
+        if len(self._samples) < self.min_samples:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, self.p95() * self.factor))
@@ -7,11 +7,11 @@ def validate_config():
     """Validate all required environment variables at startup."""
     required_vars = {
         "TELEGRAM_BOT_TOKEN": "Telegram bot token from BotFather",
-        "TELEGRAM_GLOBAL_CHAT_ID": "Telegram group chat ID where rituals will be posted",
     }
     
     optional_vars = {
         "TELEGRAM_SCOPE": "all|apac|emea|amer",
+        "CHAT_IDS": "Extra ritual chats, comma-separated (overrides in media/chats.json)",
         "DEFAULT_TOKEN": "Default crypto token (default: weedcoin)",
         "WEEDCOIN_TOKEN": "Weedcoin symbol (default: Weedcoin)",
         "TZ": "Timezone (default: America/Los_Angeles)",
@@ -22,6 +22,10 @@ def validate_config():
         if not os.getenv(var):
             missing.append(f"  {var}: {description}")
     
+    # Rituals need at least one destination
+    if not os.getenv("TELEGRAM_GLOBAL_CHAT_ID") and not os.getenv("CHAT_IDS"):
+        missing.append("  TELEGRAM_GLOBAL_CHAT_ID or CHAT_IDS: Telegram chat ID(s) where rituals will be posted")
+    
     if missing:
         error_msg = "❌ Missing required environment variables:\n" + "\n".join(missing)
         logger.error(error_msg)
@@ -1,127 +1,648 @@
 import os
+import re
 import time
-import requests
+import asyncio
 import logging
+from array import array
+
+import httpx
+
+from services import http_client
+from services.cache import TTLCache, FRESH, STALE
+from services.singleflight import SingleFlight
+from services.refresher import PopularityTracker, PriceRefresher
+from services.pair_index import PairIndex
+from services.circuit import AdaptiveTimeout, CircuitBreaker, CircuitOpenError
+from services.history import price_history
 
 logger = logging.getLogger(__name__)
 
 DEX_URL_TOKEN = "https://api.dexscreener.com/latest/dex/tokens/{id}"
 DEX_URL_SEARCH = "https://api.dexscreener.com/latest/dex/search?q={q}"
-TIMEOUT = 10
-_cache = {"key": None, "data": None, "ts": 0, "ttl": 60}
+DEX_URL_PAIR = "https://api.dexscreener.com/latest/dex/pairs/{chain}/{pair}"
+TIMEOUT = 10  # upper bound; actual per-endpoint timeouts adapt from p95 latency
+HEDGE_ENABLED = True
+HEDGE_DELAY = 0.3  # start search in parallel if the token endpoint is slower than this
+DEX_BATCH_SIZE = 30  # max addresses per /tokens/ call
+_EVM_ADDRESS_RE = re.compile(r"^0x[0-9a-fA-F]{40}$")
+_BASE58_ADDRESS_RE = re.compile(r"^[1-9A-HJ-NP-Za-km-z]{32,44}$")
+CACHE_TTL = 60
+CACHE_STALE_TTL = 300
+CACHE_MAXSIZE = 256
+_cache = TTLCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL, stale_ttl=CACHE_STALE_TTL, name="anchor")
+_inflight = SingleFlight(name="anchor")
+_last_known = TTLCache(maxsize=CACHE_MAXSIZE, ttl=float("inf"), name="last_known")
+
+# Not-found results, kept apart from the anchor cache so junk queries cannot evict real entries
+NEGATIVE_TTL = 120
+NEGATIVE_MAXSIZE = 1024
+_negative = TTLCache(maxsize=NEGATIVE_MAXSIZE, ttl=NEGATIVE_TTL, name="negative")
+
+# Fail fast during DexScreener outages instead of paying TIMEOUT per call
+BREAKER_FAILURES = 5
+BREAKER_RESET = 30
+_breaker = CircuitBreaker(failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET, name="dexscreener")
+_timeouts = {}
+
+# Query -> last resolved chain/pair, so misses need one direct pair fetch
+MIN_LIQUIDITY_USD = 1000
+
+# Cross-pair aggregate quotes
+AGG_MIN_LIQUIDITY_USD = 1000  # pools thinner than this are ignored
+AGG_OUTLIER_TOLERANCE = 0.25  # drop pairs priced >25% away from the weighted median
+_pair_index = PairIndex()
+
+# Background refresh of the most requested tokens
+REFRESH_TOP_N = 10
+REFRESH_RPM = 30
+REFRESH_LEAD = 10
+_popularity = PopularityTracker()
+
+async def _http_json(url: str, endpoint: str = "token"):
+    """
+    Fetch and parse JSON from URL over the shared connection pool.
 
-def _http_json(url: str):
-    """Fetch and parse JSON from URL."""
+    Guarded by the DexScreener circuit breaker (raises CircuitOpenError while
+    open) and using a per-endpoint timeout adapted from observed p95 latency.
+    """
+    if not _breaker.allow():
+        raise CircuitOpenError(f"DexScreener circuit open, skipping {url}")
+    tracker = _timeouts.setdefault(endpoint, AdaptiveTimeout(max_timeout=TIMEOUT))
+    timeout = tracker.timeout
+    started = time.monotonic()
     try:
-        r = requests.get(url, timeout=TIMEOUT, headers={"Accept": "application/json"})
-        r.raise_for_status()
-        return r.json()
-    except requests.Timeout:
-        logger.warning(f"Request timeout: {url}")
+        j = await http_client.get_json(url, timeout=timeout)
+    except httpx.TimeoutException:
+        tracker.observe(timeout)
+        _breaker.record_failure()
+        logger.warning(f"Request timeout ({timeout:.1f}s): {url}")
         raise
-    except requests.RequestException as e:
+    except httpx.HTTPStatusError as e:
+        # 4xx means DexScreener answered; only 5xx/429 count against the circuit
+        code = e.response.status_code
+        if code >= 500 or code == 429:
+            _breaker.record_failure()
+        else:
+            _breaker.record_success()
+        logger.warning(f"Request failed for {url}: {e}")
+        raise
+    except httpx.HTTPError as e:
+        _breaker.record_failure()
         logger.warning(f"Request failed for {url}: {e}")
         raise
     except ValueError as e:
+        _breaker.record_failure()
         logger.warning(f"Invalid JSON from {url}: {e}")
         raise
+    except asyncio.CancelledError:
+        _breaker.record_cancel()
+        raise
+    except Exception as e:
+        # e.g. httpx.InvalidURL / StreamError, which are not HTTPError subclasses;
+        # must still release a half-open probe slot
+        _breaker.record_failure()
+        logger.warning(f"Request failed for {url}: {e!r}")
+        raise
+    tracker.observe(time.monotonic() - started)
+    _breaker.record_success()
+    return j
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Pair:
+    """Compact record of the DexScreener pair fields the bot actually uses."""
+
+    __slots__ = (
+        "symbol", "address", "chain", "dex", "pair_address",
+        "price_usd", "price_native", "change24", "vol24", "liquidity_usd", "n_pairs",
+    )
+
+    def __init__(self, symbol, address, chain, dex, pair_address,
+                 price_usd, price_native, change24, vol24, liquidity_usd, n_pairs=1):
+        self.symbol = symbol
+        self.address = address
+        self.chain = chain
+        self.dex = dex
+        self.pair_address = pair_address
+        self.price_usd = price_usd
+        self.price_native = price_native
+        self.change24 = change24
+        self.vol24 = vol24
+        self.liquidity_usd = liquidity_usd
+        self.n_pairs = n_pairs  # > 1 for cross-pair aggregates
+
+    @classmethod
+    def from_payload(cls, p):
+        """Decode one raw pair dict, touching only the fields we keep."""
+        base = p.get("baseToken") or {}
+        return cls(
+            symbol=base.get("symbol") or "",
+            address=base.get("address") or "",
+            chain=p.get("chainId") or p.get("chain") or "",
+            dex=p.get("dexId") or "",
+            pair_address=p.get("pairAddress") or "",
+            price_usd=_to_float(p.get("priceUsd")),
+            price_native=_to_float(p.get("priceNative")),
+            change24=_to_float((p.get("priceChange") or {}).get("h24")),
+            vol24=_to_float((p.get("volume") or {}).get("h24")),
+            liquidity_usd=_to_float((p.get("liquidity") or {}).get("usd")),
+        )
+
+    def __repr__(self):
+        return f"Pair({self.symbol} {self.chain}/{self.dex} {self.pair_address} ${self.price_usd})"
+
 
 def _pick_pair(payload):
-    """Select the pair with highest 24h volume."""
+    """Select the pair with highest 24h volume in one pass and decode it into a Pair."""
     pairs = (payload or {}).get("pairs") or []
     if not pairs:
         logger.debug("No pairs in payload")
         return None
+    best, best_vol = None, -1.0
+    for p in pairs:
+        try:
+            vol = float((p.get("volume") or {}).get("h24") or 0)
+        except (AttributeError, TypeError, ValueError):
+            vol = 0.0
+        if vol > best_vol:
+            best, best_vol = p, vol
     try:
-        return sorted(
-            pairs,
-            key=lambda p: float(p.get("volume", {}).get("h24") or 0),
-            reverse=True
-        )[0]
+        return Pair.from_payload(best)
     except Exception as e:
         logger.warning(f"Error selecting pair: {e}")
         return None
 
+def _weighted_median(values, weights):
+    order = sorted(range(len(values)), key=values.__getitem__)
+    half, acc = sum(weights) / 2.0, 0.0
+    for i in order:
+        acc += weights[i]
+        if acc >= half:
+            return values[i]
+    return values[order[-1]]
+
+
+def _blend_weights(vol, liq):
+    """Half volume share + half liquidity share per pair (a term is skipped if its total is 0)."""
+    tv, tl = sum(vol), sum(liq)
+    return array("d", (
+        (v / tv if tv else 0.0) + (l / tl if tl else 0.0) or 1e-12
+        for v, l in zip(vol, liq)
+    ))
+
+
+def _aggregate_pairs(payload):
+    """
+    Volume- and liquidity-weighted price across every pair of the dominant base token.
+
+    Pairs are decoded once into parallel float columns. Only pairs sharing the
+    top-volume pair's base token are used; illiquid pools and prices more than
+    AGG_OUTLIER_TOLERANCE from the weighted median are dropped. Returns a Pair
+    (dex="aggregate") whose volume/liquidity are the kept pairs' totals.
+    """
+    raw = (payload or {}).get("pairs") or []
+    bases, chains = [], []
+    price, vol, liq, chg = array("d"), array("d"), array("d"), array("d")
+    best_i, best_vol, best_raw = -1, -1.0, None
+    for p in raw:
+        px = _to_float(p.get("priceUsd"))
+        if not px or px <= 0:
+            continue
+        v = _to_float((p.get("volume") or {}).get("h24")) or 0.0
+        if v > best_vol:
+            best_i, best_vol, best_raw = len(price), v, p
+        bases.append(((p.get("baseToken") or {}).get("address") or "").lower())
+        chains.append(p.get("chainId") or "")
+        price.append(px)
+        vol.append(v)
+        liq.append(_to_float((p.get("liquidity") or {}).get("usd")) or 0.0)
+        chg.append(_to_float((p.get("priceChange") or {}).get("h24")) or 0.0)
+    if best_raw is None:
+        return None
+
+    best = Pair.from_payload(best_raw)
+    base = bases[best_i]
+    idx = [i for i in range(len(price))
+           if bases[i] == base and (liq[i] >= AGG_MIN_LIQUIDITY_USD or i == best_i)]
+
+    w = _blend_weights([vol[i] for i in idx], [liq[i] for i in idx])
+    median = _weighted_median([price[i] for i in idx], w)
+    idx = [i for i in idx if abs(price[i] / median - 1.0) <= AGG_OUTLIER_TOLERANCE] or [best_i]
+    w = _blend_weights([vol[i] for i in idx], [liq[i] for i in idx])
+    tw = sum(w)
+
+    kept_chains = {chains[i] for i in idx}
+    return Pair(
+        symbol=best.symbol,
+        address=best.address,
+        chain=best.chain if len(kept_chains) == 1 else "multi",
+        dex="aggregate",
+        pair_address=best.pair_address,
+        price_usd=sum(wi * price[i] for wi, i in zip(w, idx)) / tw,
+        price_native=None,
+        change24=sum(wi * chg[i] for wi, i in zip(w, idx)) / tw,
+        vol24=sum(vol[i] for i in idx),
+        liquidity_usd=sum(liq[i] for i in idx),
+        n_pairs=len(idx),
+    )
+
+
 def _format_anchor(pair):
-    """Format pair data into user-friendly anchor message."""
+    """Format pair data (Pair record or raw pair dict) into user-friendly anchor message."""
     try:
-        price = pair.get("priceUsd") or pair.get("priceNative") or "?"
-        change = pair.get("priceChange", {}).get("h24")
-        vol24 = pair.get("volume", {}).get("h24")
+        if not isinstance(pair, Pair):
+            pair = Pair.from_payload(pair)
+        price = pair.price_usd if pair.price_usd is not None else pair.price_native
+        change = pair.change24
+        vol24 = pair.vol24
         
         # Format price
-        try:
-            price = f"${float(price):,.6f}".rstrip("0").rstrip(".")
-        except (ValueError, TypeError):
-            price = "N/A"
+        price = f"${price:,.6f}".rstrip("0").rstrip(".") if price is not None else "N/A"
         
         # Format change
-        try:
-            change_txt = f"{float(change):+.2f}%" if change else "±0.00%"
-        except (ValueError, TypeError):
-            change_txt = "±0.00%"
+        change_txt = f"{change:+.2f}%" if change else "±0.00%"
         
         # Format volume
-        try:
-            vol24_txt = f"${float(vol24):,.0f}" if vol24 else "$0"
-        except (ValueError, TypeError):
-            vol24_txt = "$0"
-        
-        symbol = pair.get("baseToken", {}).get("symbol") or "TOKEN"
+        vol24_txt = f"${vol24:,.0f}" if vol24 else "$0"
         
         return {
-            "symbol": symbol,
+            "symbol": pair.symbol or "TOKEN",
             "price": price,
             "change24": change_txt,
             "vol24": vol24_txt,
-            "chain": pair.get("chainId") or pair.get("chain") or "",
-            "dex": pair.get("dexId") or "",
-            "pair": pair.get("pairAddress") or ""
+            "chain": pair.chain,
+            "dex": pair.dex,
+            "pair": pair.pair_address,
+            "pairs": pair.n_pairs
         }
     except Exception as e:
         logger.exception(f"Error formatting anchor: {e}")
         return None
 
-def get_anchor(token_id: str):
-    """Get formatted anchor data for a token, with caching."""
-    now = time.time()
-    
-    # Check cache
-    if _cache["key"] == token_id and now - _cache["ts"] < _cache["ttl"]:
-        logger.debug(f"Cache hit for {token_id}")
-        return _cache["data"]
-    
+def invalidate_pair(token_id: str):
+    """Forget the indexed pair for a query so the next miss re-resolves it."""
+    return _pair_index.invalidate(token_id)
+
+
+async def _fetch_indexed_pair(token_id: str, chain: str, pair_address: str):
+    """Fetch a previously resolved pair directly; invalidate it if gone or illiquid."""
+    try:
+        j = await _http_json(DEX_URL_PAIR.format(chain=chain, pair=pair_address), endpoint="pair")
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code >= 500 or e.response.status_code == 429:
+            raise
+        invalidate_pair(token_id)
+        return None
+    j = j or {}
+    pair = _pick_pair(j) or (Pair.from_payload(j["pair"]) if j.get("pair") else None)
+    liquidity = pair.liquidity_usd if pair else None
+    if not pair or (liquidity is not None and liquidity < MIN_LIQUIDITY_USD):
+        logger.info(f"Indexed pair for {token_id} unavailable or illiquid ({liquidity}), re-resolving")
+        invalidate_pair(token_id)
+        return None
+    return pair
+
+
+async def _pair_from(url: str, endpoint: str, pick=_pick_pair):
+    return pick(await _http_json(url, endpoint=endpoint))
+
+
+async def _resolve_sequential(token_id: str, pick=_pick_pair):
+    """Token endpoint, then search if it yields no pair."""
+    pair = await _pair_from(DEX_URL_TOKEN.format(id=token_id), "token", pick)
+    if not pair:
+        logger.debug(f"No pair found by ID, searching: {token_id}")
+        pair = await _pair_from(DEX_URL_SEARCH.format(q=token_id), "search", pick)
+    return pair
+
+
+async def _resolve_hedged(token_id: str, pick=_pick_pair):
+    """
+    Token endpoint first; if it has not answered within HEDGE_DELAY, start the
+    search request in parallel and take whichever valid pair arrives first,
+    cancelling the other. A fast empty token answer falls back to search.
+    """
+    token_task = asyncio.ensure_future(_pair_from(DEX_URL_TOKEN.format(id=token_id), "token", pick))
+    tasks = [token_task]
+    errors = []
+    try:
+        done, _ = await asyncio.wait({token_task}, timeout=HEDGE_DELAY)
+        if done:
+            # Answered within the hedge delay: use it, or fall back to search
+            if token_task.exception():
+                errors.append(token_task.exception())
+            elif token_task.result():
+                return token_task.result()
+            logger.debug(f"No pair found by ID, searching: {token_id}")
+        else:
+            logger.debug(f"Token endpoint slow for {token_id}, hedging with search")
+
+        tasks.append(asyncio.ensure_future(_pair_from(DEX_URL_SEARCH.format(q=token_id), "search", pick)))
+        pending = {t for t in tasks if not t.done()}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception():
+                    errors.append(task.exception())
+                elif task.result():
+                    return task.result()
+
+        if errors:
+            raise errors[0]
+        return None
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+def _remember(token_id: str, pair: Pair) -> None:
+    """Cache a freshly fetched pair and queue it for the base token's price history."""
+    _cache.set(token_id, pair)
+    _last_known.set(token_id, pair)
+    _negative.pop(token_id)
+    price_history.record(pair.address or token_id, pair.price_usd, pair.change24, pair.vol24)
+
+
+async def _fetch_pair(token_id: str, search_only: bool = False):
+    """Resolve a token against DexScreener and cache the compact Pair record."""
     try:
         logger.debug(f"Fetching data for {token_id}...")
         
-        # Try token endpoint first
-        j = _http_json(DEX_URL_TOKEN.format(id=token_id))
-        pair = _pick_pair(j)
+        # Known query: one direct pair fetch
+        pair = None
+        indexed = _pair_index.get(token_id)
+        if indexed:
+            pair = await _fetch_indexed_pair(token_id, *indexed)
+        from_index = pair is not None
         
-        # Fallback to search endpoint
-        if not pair:
+        # Token endpoint, hedged with search (skipped when a batch call already missed)
+        if not pair and not search_only:
+            pair = await _resolve_hedged(token_id) if HEDGE_ENABLED else await _resolve_sequential(token_id)
+        elif not pair:
             logger.debug(f"No pair found by ID, searching: {token_id}")
-            j = _http_json(DEX_URL_SEARCH.format(q=token_id))
-            pair = _pick_pair(j)
+            pair = await _pair_from(DEX_URL_SEARCH.format(q=token_id), "search")
         
         if not pair:
             logger.warning(f"No trading pair found for {token_id}")
+            _negative.set(token_id, True)
             return None
         
-        # Format and cache
-        data = _format_anchor(pair)
-        if data:
-            _cache.update({"key": token_id, "data": data, "ts": now})
-            logger.debug(f"✅ Got anchor for {token_id}: {data['symbol']} {data['price']}")
+        if not from_index:
+            _pair_index.put(token_id, pair.chain, pair.pair_address)
+        
+        # Cache only the compact record; formatting happens on read
+        _remember(token_id, pair)
+        logger.debug(f"✅ Got anchor for {token_id}: {pair.symbol} {pair.price_usd}")
         
-        return data
+        return pair
         
-    except requests.Timeout:
+    except CircuitOpenError:
+        logger.debug(f"DexScreener circuit open; serving last known value for {token_id}")
+        return _last_known.peek(token_id)
+    except httpx.TimeoutException:
         logger.warning(f"DexScreener timeout for {token_id}")
-        return None
-    except requests.RequestException as e:
+        return _last_known.peek(token_id)
+    except httpx.HTTPError as e:
         logger.warning(f"DexScreener error for {token_id}: {e}")
-        return None
+        return _last_known.peek(token_id)
     except Exception as e:
         logger.exception(f"Unexpected error getting anchor for {token_id}: {e}")
         return None
+
+
+def _schedule_refresh(token_id: str):
+    """Refresh a stale entry in the background (joins any in-flight fetch)."""
+    _inflight.start(token_id, _fetch_pair, token_id)
+
+
+async def get_pair(token_id: str):
+    """
+    Get the best Pair record for a token, with caching.
+
+    Fresh entries are returned directly; stale ones are returned immediately
+    while a background refresh runs. Misses fetch from DexScreener; concurrent
+    misses for the same token share a single upstream fetch. Tokens that
+    recently resolved to nothing are answered from the negative cache.
+    """
+    if _negative.get(token_id):
+        logger.debug(f"Negative cache hit for {token_id}")
+        return None
+    _popularity.record(token_id)
+    state, pair = _cache.lookup(token_id)
+    if state == FRESH:
+        logger.debug(f"Cache hit for {token_id}")
+        return pair
+    if state == STALE:
+        logger.debug(f"Serving stale anchor for {token_id}, revalidating")
+        _schedule_refresh(token_id)
+        return pair
+    return await _inflight.do(token_id, _fetch_pair, token_id)
+
+
+def cached_pair(token_id: str):
+    """The cached Pair while still fresh, without fetching or touching cache stats."""
+    left = _cache.expires_in(token_id)
+    return _cache.peek(token_id) if left is not None and left > 0 else None
+
+
+async def get_anchor(token_id: str):
+    """Get formatted anchor data for a token (see get_pair for caching)."""
+    pair = await get_pair(token_id)
+    return _format_anchor(pair) if pair else None
+
+
+async def _fetch_aggregate(token_id: str):
+    """Fetch every pair for a token and cache the weighted aggregate."""
+    key = f"agg:{token_id}"
+    try:
+        resolve = _resolve_hedged if HEDGE_ENABLED else _resolve_sequential
+        agg = await resolve(token_id, pick=_aggregate_pairs)
+    except CircuitOpenError:
+        return _last_known.peek(key)
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning(f"DexScreener aggregate error for {token_id}: {e}")
+        return _last_known.peek(key)
+    # Own negative key: a token with no aggregatable pair may still have a quotable one
+    if not agg:
+        _negative.set(key, True)
+    else:
+        _cache.set(key, agg)
+        _last_known.set(key, agg)
+        _negative.pop(key)
+        logger.debug(f"Aggregate for {token_id}: {agg.n_pairs} pairs, ${agg.price_usd}")
+    return agg
+
+
+async def get_aggregate(token_id: str):
+    """Volume/liquidity-weighted quote across all pairs of a token, cached like get_pair."""
+    key = f"agg:{token_id}"
+    if _negative.get(token_id) or _negative.get(key):
+        return None
+    _popularity.record(token_id)
+    state, agg = _cache.lookup(key)
+    if state == FRESH:
+        return agg
+    if state == STALE:
+        _inflight.start(key, _fetch_aggregate, token_id)
+        return agg
+    return await _inflight.do(key, _fetch_aggregate, token_id)
+
+
+async def get_aggregate_anchor(token_id: str):
+    """Formatted anchor for the aggregate quote (same keys as get_anchor, plus "pairs")."""
+    agg = await get_aggregate(token_id)
+    return _format_anchor(agg) if agg else None
+
+
+def _pairs_by_base(payload):
+    """Group the pairs of a multi-token payload by lower-cased base token address."""
+    groups = {}
+    for p in (payload or {}).get("pairs") or []:
+        addr = (p.get("baseToken") or {}).get("address")
+        if addr:
+            groups.setdefault(addr.lower(), []).append(p)
+    return groups
+
+
+async def _fetch_batch(token_ids):
+    """Resolve up to DEX_BATCH_SIZE addresses with one /tokens/ call; cache and return hits."""
+    try:
+        j = await _http_json(DEX_URL_TOKEN.format(id=",".join(token_ids)))
+    except (httpx.HTTPError, ValueError, CircuitOpenError) as e:
+        logger.warning(f"DexScreener batch lookup failed for {len(token_ids)} tokens: {e}")
+        return {}
+    except Exception as e:
+        logger.exception(f"Unexpected error in batch lookup for {len(token_ids)} tokens: {e}")
+        return {}
+
+    groups = _pairs_by_base(j)
+    found = {}
+    for token_id in token_ids:
+        pair = _pick_pair({"pairs": groups.get(token_id.lower())})
+        if pair:
+            _remember(token_id, pair)
+            _pair_index.put(token_id, pair.chain, pair.pair_address)
+            found[token_id] = pair
+    logger.debug(f"Batch resolved {len(found)}/{len(token_ids)} tokens")
+    return found
+
+
+def is_address(token_id: str) -> bool:
+    """EVM (0x) or base58 (Solana mint) address; the only ids the batch endpoint accepts."""
+    return bool(_EVM_ADDRESS_RE.match(token_id) or _BASE58_ADDRESS_RE.match(token_id))
+
+
+async def get_anchors(token_ids):
+    """
+    Get anchors for many tokens with as few upstream calls as possible.
+
+    Cached entries are served as in get_anchor. Missing addresses without a
+    pair index entry are resolved in chunks of DEX_BATCH_SIZE via the
+    comma-separated /tokens/ endpoint, and pairs are split back per base
+    token; addresses the batch cannot resolve fall back to the search
+    endpoint. Symbols and indexed ids take the get_anchor path (one direct
+    pair fetch when indexed). Returns {token_id: anchor or None} in input order.
+    """
+    ids = list(dict.fromkeys(t for t in token_ids if t))
+    results = {}
+    missing = []
+    for token_id in ids:
+        if _negative.get(token_id):
+            continue
+        _popularity.record(token_id)
+        state, data = _cache.lookup(token_id)
+        if state == FRESH:
+            results[token_id] = data
+        elif state == STALE:
+            results[token_id] = data
+            _schedule_refresh(token_id)
+        else:
+            missing.append(token_id)
+
+    batchable = [t for t in missing if is_address(t) and not _pair_index.get(t)]
+    single = [t for t in missing if t not in batchable]
+    chunks = [tuple(batchable[i:i + DEX_BATCH_SIZE]) for i in range(0, len(batchable), DEX_BATCH_SIZE)]
+    batches, singles = await asyncio.gather(
+        asyncio.gather(*(_inflight.do(("batch",) + c, _fetch_batch, c) for c in chunks)),
+        asyncio.gather(*(_inflight.do(t, _fetch_pair, t) for t in single)),
+    )
+    results.update(zip(single, singles))
+    for found in batches:
+        results.update(found)
+
+    unresolved = [t for t in batchable if t not in results]
+    if unresolved:
+        fallbacks = await asyncio.gather(
+            *(_inflight.do(t, _fetch_pair, t, search_only=True) for t in unresolved)
+        )
+        results.update(zip(unresolved, fallbacks))
+
+    return {token_id: _format_anchor(results[token_id]) if results.get(token_id) else None for token_id in ids}
+
+
+async def _refresh(token_id: str):
+    return await _inflight.do(token_id, _fetch_pair, token_id)
+
+
+_refresher = PriceRefresher(
+    _popularity,
+    _cache,
+    _refresh,
+    top_n=REFRESH_TOP_N,
+    rpm=REFRESH_RPM,
+    lead=REFRESH_LEAD,
+    skip=lambda token_id: (_negative.expires_in(token_id) or 0) > 0,
+)
+
+
+def start_refresher():
+    """Start the popularity-driven background refresher (needs a running loop)."""
+    _refresher.start()
+
+
+async def stop_refresher():
+    await _refresher.stop()
+
+
+def flush_pair_index():
+    """Persist pending pair index changes (called on shutdown)."""
+    _pair_index.flush()
+
+
+def refresher_stats():
+    return _refresher.stats()
+
+
+def upstream_stats():
+    """Circuit breaker state and current adaptive timeout per endpoint."""
+    return {
+        **_breaker.stats(),
+        "timeouts": {name: round(t.timeout, 2) for name, t in _timeouts.items()},
+    }
+
+
+def negative_cache_stats():
+    """Hit/miss counters and size of the not-found cache."""
+    return _negative.stats()
+
+
+def cache_stats():
+    """Hit/miss/stale counters and size of the anchor cache, plus upstream fetch counts."""
+    return {**_cache.stats(), **_inflight.stats()}
+
+
+def get_anchor_sync(token_id: str):
+    """Blocking wrapper around get_anchor for scripts and tests (not for handlers)."""
+    async def _run():
+        try:
+            return await get_anchor(token_id)
+        finally:
+            await http_client.aclose()
+
+    return asyncio.run(_run())
@@ -1,6 +1,8 @@
 import logging
 from telegram.error import NetworkError, TelegramError
 
+from services.outbox import PRIORITY_ERROR
+
 logger = logging.getLogger(__name__)
 
 async def on_error(update, context):
@@ -28,7 +30,8 @@ async def on_error(update, context):
         try:
             await context.bot.send_message(
                 chat_id=chat_id,
-                text="⚠️ Telegram API temporarily unavailable. Please try again in a moment."
+                text="⚠️ Telegram API temporarily unavailable. Please try again in a moment.",
+                rate_limit_args={"priority": PRIORITY_ERROR},
             )
         except Exception as notify_err:
             logger.exception(f"Failed to notify user of API error: {notify_err}")
@@ -44,7 +47,8 @@ async def on_error(update, context):
     try:
         await context.bot.send_message(
             chat_id=chat_id,
-            text="💥 An unexpected error occurred. Our team has been notified."
+            text="💥 An unexpected error occurred. Our team has been notified.",
+            rate_limit_args={"priority": PRIORITY_ERROR},
         )
     except Exception as notify_err:
         logger.exception(f"Failed to notify user of error: {notify_err}")
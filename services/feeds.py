@@ -0,0 +1,404 @@
+"""
+News feeds — a shared, conditionally refreshed RSS cache plus concurrent
+first-success fetching in priority order.
+"""
+import time
+import asyncio
+import logging
+import re
+import email.utils
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import httpx
+
+from services import http_client
+from services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+FEED_TIMEOUT = 6  # seconds per feed request
+FEED_DEADLINE = 8  # seconds for a whole /news lookup
+FEED_ITEMS = 10  # items kept per feed
+FEED_REFRESH = 180  # seconds between background refreshes
+
+
+class FeedItem(NamedTuple):
+    channel: str
+    title: str
+    link: str
+    published: Optional[float] = None  # epoch seconds from pubDate, if the feed gives one
+    seen: Optional[float] = None  # when the cache first saw this link
+    summary: str = ""
+
+    def age(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds since publication (or first sighting, for feeds without dates)."""
+        born = self.published or self.seen
+        if born is None:
+            return None
+        now = time.time() if now is None else now
+        return max(0.0, now - born)
+
+
+@dataclass
+class FeedEntry:
+    """Parsed items of one feed plus the validators for the next conditional GET."""
+    items: List[FeedItem]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched: float = 0.0  # last 200
+    checked: float = 0.0  # last 200 or 304
+
+
+ATOM_NS = "http://www.w3.org/2005/Atom"
+_TEXT_NS = ("", ATOM_NS)  # title/link/summary from other namespaces (media:, itunes:) are ignored
+_TAG_RE = re.compile(r"<[^>]+>")
+_WS_RE = re.compile(r"\s+")
+SUMMARY_CHARS = 280
+STREAM_CHUNK = 16 * 1024
+
+
+def _parse_date(text: Optional[str]) -> Optional[float]:
+    """RFC 822 (RSS pubDate) or ISO 8601 (Atom, dc:date) to epoch seconds."""
+    if not text:
+        return None
+    text = text.strip()
+    try:
+        return email.utils.parsedate_to_datetime(text).timestamp()
+    except (TypeError, ValueError):
+        pass
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _split(tag: str) -> Tuple[str, str]:
+    if tag.startswith("{"):
+        ns, _, local = tag[1:].partition("}")
+        return ns, local
+    return "", tag
+
+
+def _plain(text: str) -> str:
+    return _WS_RE.sub(" ", _TAG_RE.sub(" ", text)).strip()
+
+
+class FeedParser:
+    """
+    Incremental RSS 2.0 / Atom parser.
+
+    feed() takes raw chunks as they arrive and returns True once `limit`
+    items are complete, so the caller can stop reading the body. Each item
+    element is cleared and detached from the tree as soon as it is decoded,
+    so memory stays bounded by one item regardless of feed size.
+    """
+
+    def __init__(self, limit: int = FEED_ITEMS, url: str = ""):
+        self.limit = limit
+        self.url = url
+        self.channel = ""
+        self.items: List[FeedItem] = []
+        self.skipped = 0
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._stack: List[ET.Element] = []
+        self._in_item = 0
+
+    @property
+    def done(self) -> bool:
+        return len(self.items) >= self.limit
+
+    def feed(self, chunk: bytes) -> bool:
+        if not self.done:
+            self._parser.feed(chunk)
+            self._drain()
+        return self.done
+
+    def close(self) -> List[FeedItem]:
+        """Finish the document (if not stopped early) and return the items."""
+        if not self.done:
+            self._parser.close()
+            self._drain()
+        if not self.items:
+            logger.debug("No items in feed: %s", self.url)
+        return self.items
+
+    def _drain(self) -> None:
+        for event, el in self._parser.read_events():
+            ns, tag = _split(el.tag)
+            if event == "start":
+                self._stack.append(el)
+                if tag in ("item", "entry"):
+                    self._in_item += 1
+                continue
+            self._stack.pop()
+            if tag in ("item", "entry"):
+                self._in_item -= 1
+                self._add(el)
+                el.clear()
+                if self._stack:
+                    self._stack[-1].remove(el)
+                if self.done:
+                    return
+            elif tag == "title" and ns in _TEXT_NS and not self._in_item and not self.channel:
+                # <channel><title> (RSS) or <feed><title> (Atom)
+                parent = _split(self._stack[-1].tag)[1] if self._stack else ""
+                if parent in ("channel", "feed"):
+                    self.channel = (el.text or "").strip()
+
+    def _add(self, el: ET.Element) -> None:
+        title = link = summary = ""
+        published = None
+        for child in el:
+            ns, tag = _split(child.tag)
+            if tag == "title" and ns in _TEXT_NS and not title:
+                title = _plain("".join(child.itertext()))
+            elif tag == "link" and ns in _TEXT_NS:
+                # RSS: <link>url</link>; Atom: <link rel="alternate" href="url"/> (rel="self" etc. skipped)
+                if child.attrib.get("rel", "alternate") != "alternate" or link:
+                    continue
+                link = (child.text or "").strip() or child.attrib.get("href", "").strip()
+            elif tag in ("description", "summary", "content") and ns in _TEXT_NS and not summary:
+                summary = _plain("".join(child.itertext()))[:SUMMARY_CHARS]
+            elif tag in ("pubDate", "published", "updated", "date") and published is None:
+                published = _parse_date(child.text)
+        if not title or not link:
+            self.skipped += 1
+            logger.debug("Invalid item in feed: %s", self.url)
+            return
+        self.items.append(FeedItem(self.channel, title, link, published, summary=summary))
+
+
+def parse_items(content: bytes, url: str = "", limit: int = FEED_ITEMS) -> List[FeedItem]:
+    """Return up to `limit` valid items of an RSS or Atom document, fed in STREAM_CHUNK pieces."""
+    parser = FeedParser(limit, url)
+    for start in range(0, len(content), STREAM_CHUNK):
+        if parser.feed(content[start:start + STREAM_CHUNK]):
+            break
+    return parser.close()
+
+
+async def stream_items(response: httpx.Response, url: str = "", limit: int = FEED_ITEMS) -> List[FeedItem]:
+    """Parse a streamed response, stopping the download once `limit` items are in."""
+    parser = FeedParser(limit, url)
+    async for chunk in response.aiter_bytes(STREAM_CHUNK):
+        if parser.feed(chunk):
+            break
+    return parser.close()
+
+
+def parse_first_item(content: bytes, url: str = "") -> Optional[FeedItem]:
+    """Return the first valid item of an RSS or Atom document."""
+    items = parse_items(content, url, limit=1)
+    return items[0] if items else None
+
+
+class FeedCache:
+    """
+    Process-wide feed cache keyed by URL.
+
+    fetch() revalidates with If-None-Match / If-Modified-Since; a 304 keeps
+    the already parsed items and only bumps `checked`. A failed fetch keeps
+    serving the last good entry. A background task refreshes every watched
+    URL every `refresh_interval` seconds so handlers can answer from memory.
+    """
+
+    def __init__(self, *, refresh_interval: float = FEED_REFRESH, deadline: float = FEED_DEADLINE):
+        self.refresh_interval = refresh_interval
+        self.deadline = deadline
+        self._entries: Dict[str, FeedEntry] = {}
+        self._watched: Dict[str, None] = {}
+        self._inflight = SingleFlight("feeds")
+        self._task: Optional[asyncio.Task] = None
+        self.version = 0  # bumped whenever an entry's items change
+        self.fetches = 0
+        self.not_modified = 0
+        self.errors = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def watch(self, urls: Iterable[str]) -> None:
+        """Add URLs to the background refresh set (in priority order)."""
+        self._watched.update(dict.fromkeys(urls))
+
+    def get(self, url: str) -> Optional[FeedEntry]:
+        return self._entries.get(url)
+
+    async def _fetch(self, url: str) -> Optional[FeedEntry]:
+        entry = self._entries.get(url)
+        headers = {}
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        try:
+            # Streamed, so the body stops downloading once enough items are parsed.
+            # Not http_client.get(): raise_for_status() treats 304 as an error.
+            async with http_client.get_client().stream("GET", url, timeout=FEED_TIMEOUT, headers=headers) as r:
+                now = time.time()
+                if r.status_code == 304 and entry is not None:
+                    self.not_modified += 1
+                    entry.checked = now
+                    return entry
+                r.raise_for_status()
+                items = await stream_items(r, url)
+        except httpx.TimeoutException:
+            logger.warning("Timeout fetching feed: %s", url)
+        except httpx.HTTPError as e:
+            logger.warning("Request error fetching feed %s: %s", url, e)
+        except ET.ParseError as e:
+            logger.warning("XML parse error in feed %s: %s", url, e)
+        except Exception as e:
+            logger.exception("Unexpected error fetching feed %s: %s", url, e)
+        else:
+            self.fetches += 1
+            seen = {item.link: item.seen for item in entry.items} if entry is not None else {}
+            fresh = FeedEntry(
+                [item._replace(seen=seen.get(item.link, now)) for item in items],
+                etag=r.headers.get("ETag"),
+                last_modified=r.headers.get("Last-Modified"),
+                fetched=now,
+                checked=now,
+            )
+            self._entries[url] = fresh
+            self.version += 1
+            return fresh
+        self.errors += 1
+        return entry
+
+    async def fetch(self, url: str) -> Optional[FeedEntry]:
+        """Revalidate one feed now (coalesced per URL); returns the current entry, even if stale."""
+        return await self._inflight.do(url, self._fetch, url)
+
+    async def fetch_first(self, url: str) -> Optional[FeedItem]:
+        entry = await self.fetch(url)
+        return entry.items[0] if entry is not None and entry.items else None
+
+    def first_cached(self, urls: Iterable[str]) -> Optional[FeedItem]:
+        """First item of the first cached feed in `urls`, from memory only."""
+        for url in urls:
+            entry = self._entries.get(url)
+            if entry is not None and entry.items:
+                self.hits += 1
+                return entry.items[0]
+        self.misses += 1
+        return None
+
+    async def first_item(self, urls: Iterable[str]) -> Optional[FeedItem]:
+        """Answer from memory; only a cold cache goes to the network (concurrently, bounded)."""
+        urls = list(urls)
+        item = self.first_cached(urls)
+        if item is None:
+            item = await first_success(urls, deadline=self.deadline, fetch=self.fetch_first)
+        return item
+
+    # --- background refresh ----------------------------------------------
+
+    async def refresh(self) -> int:
+        """Revalidate every watched URL concurrently; returns how many answered."""
+        urls = list(self._watched)
+        if not urls:
+            return 0
+        tasks = [asyncio.ensure_future(self.fetch(url)) for url in urls]
+        done, pending = await asyncio.wait(tasks, timeout=FEED_TIMEOUT + 1)
+        for task in pending:
+            task.cancel()
+        return sum(1 for t in done if not t.cancelled() and not t.exception() and t.result())
+
+    async def _loop(self) -> None:
+        logger.info("Feed refresher started (%d feeds, every %ds)", len(self._watched), self.refresh_interval)
+        while True:
+            try:
+                ok = await self.refresh()
+                logger.debug("Refreshed %d/%d feeds", ok, len(self._watched))
+            except Exception as e:
+                logger.warning("Feed refresh failed: %s", e)
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in self._inflight.tasks():
+            task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "feeds": len(self._entries),
+            "watched": len(self._watched),
+            "hits": self.hits,
+            "misses": self.misses,
+            "fetches": self.fetches,
+            "not_modified": self.not_modified,
+            "errors": self.errors,
+        }
+
+
+def _unique(urls: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(urls))
+
+
+async def fetch_first_item(url: str) -> Optional[FeedItem]:
+    """Fetch one feed through the shared cache; None on any failure."""
+    return await feed_cache.fetch_first(url)
+
+
+async def first_success(
+    urls: Iterable[str],
+    *,
+    deadline: float = FEED_DEADLINE,
+    fetch: Callable[[str], Awaitable[Optional[FeedItem]]] = fetch_first_item,
+) -> Optional[FeedItem]:
+    """
+    Fetch all `urls` concurrently and return the first valid item in list order.
+
+    A feed's answer is used as soon as every feed ahead of it has failed, so a
+    fast low-priority feed never beats a healthy high-priority one. Once
+    `deadline` passes, the best answer received so far wins. Requests still in
+    flight are cancelled either way.
+    """
+    tasks = [asyncio.ensure_future(fetch(url)) for url in _unique(urls)]
+    if not tasks:
+        return None
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    try:
+        for task in tasks:
+            remaining = end - loop.time()
+            if remaining <= 0:
+                break
+            done, _ = await asyncio.wait({task}, timeout=remaining)
+            if not done:
+                break
+            if not task.exception() and task.result():
+                return task.result()
+
+        # Deadline hit while a higher-priority feed was still pending
+        for task in tasks:
+            if task.done() and not task.cancelled() and not task.exception() and task.result():
+                return task.result()
+        logger.warning("No feed answered within %.1fs (%d tried)", deadline, len(tasks))
+        return None
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+feed_cache = FeedCache()
@@ -0,0 +1,464 @@
+"""
+Price history — one memory-mapped columnar file per token, plus
+incrementally maintained 1m/1h/1d OHLC rollups.
+
+Layout: a 32-byte header (magic, column count, row count, capacity) followed
+by float64 columns of `capacity` slots each. Raw files hold ts, price,
+change24, vol24. Timestamps are kept non-decreasing, so range queries are a
+binary search and reads return memoryview slices straight over the mapping
+(no copies, no parsing).
+"""
+import os
+import re
+import mmap
+import time
+import struct
+import bisect
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple, Type
+
+from config import SETTINGS
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DIR = os.path.join(SETTINGS.DATA_DIR, "history")
+MAGIC = b"TKH2"
+HEADER = struct.Struct("<4sIQQ8x")  # magic, n_columns, count, capacity, pad → 32 bytes
+LEGACY_MAGIC = b"TKH1"  # raw files before rollups: n_columns was padding (0)
+ITEM = 8  # float64
+INITIAL_CAPACITY = 1024
+
+# Rollup resolutions (seconds) and how long each tier is kept; None = forever
+RESOLUTIONS = {"1m": 60, "1h": 3600, "1d": 86400}
+RETENTION = {"raw": 2 * 86400, "1m": 7 * 86400, "1h": 400 * 86400, "1d": None}
+COMPACT_INTERVAL_HOURS = 1
+
+
+class Series(NamedTuple):
+    """Column views for a time range; valid for as long as you hold them."""
+    ts: memoryview
+    price: memoryview
+    change24: memoryview
+    vol24: memoryview
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+
+class OHLC(NamedTuple):
+    """
+    Rollup bucket columns. ts is the bucket start; vol24 is the last rolling
+    24h volume reported within the bucket (DexScreener gives no per-trade
+    volume, so it is a level, not a sum).
+    """
+    ts: memoryview
+    open: memoryview
+    high: memoryview
+    low: memoryview
+    close: memoryview
+    vol24: memoryview
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+
+def _nan(value: Optional[float]) -> float:
+    return float("nan") if value is None else float(value)
+
+
+class TokenSeries:
+    """
+    Append-only columnar time series backed by a single mmap'd file; columns come from `row`'s fields.
+
+    One thread writes; any thread may read. Readers take `lock`, which the
+    writer holds only while publishing a new row count or a new mapping
+    (after growth or compaction), so they always see columns and count
+    from the same file.
+    """
+
+    def __init__(self, path: str, initial_capacity: int = INITIAL_CAPACITY, row: Type[NamedTuple] = Series):
+        self.path = path
+        self.row = row
+        self.columns = row._fields
+        self.initial_capacity = initial_capacity
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._cols: Dict[str, memoryview] = {}
+        self.count = 0
+        self.capacity = 0
+        self.lock = threading.RLock()
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+            self._open()
+        else:
+            self._create(initial_capacity)
+
+    def _file_size(self, capacity: int) -> int:
+        return HEADER.size + len(self.columns) * capacity * ITEM
+
+    def _create(self, capacity: int, source: Optional["TokenSeries"] = None, start: int = 0) -> None:
+        """Write a fresh file with `capacity` slots (copying `source` rows from `start`) and swap it in atomically."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        count = source.count - start if source else 0
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.truncate(self._file_size(capacity))
+            f.write(HEADER.pack(MAGIC, len(self.columns), count, capacity))
+            if source:
+                for i, name in enumerate(self.columns):
+                    f.seek(HEADER.size + i * capacity * ITEM)
+                    f.write(source._cols[name][start:source.count])
+        os.replace(tmp, self.path)
+        self._open()
+
+    def _open(self) -> None:
+        # Views handed out earlier keep the old mapping (and inode) alive; just drop our refs
+        f = open(self.path, "r+b")
+        try:
+            mapping = mmap.mmap(f.fileno(), 0)
+            magic, n_columns, count, capacity = HEADER.unpack_from(mapping, 0)
+            if magic == LEGACY_MAGIC and n_columns == 0 and self.columns == Series._fields:
+                # Same column layout, the column count just lived in padding: upgrade in place
+                n_columns = len(self.columns)
+                HEADER.pack_into(mapping, 0, MAGIC, n_columns, count, capacity)
+                magic = MAGIC
+                logger.info("Upgraded price history file %s", self.path)
+            if magic != MAGIC or n_columns != len(self.columns) or len(mapping) < self._file_size(capacity):
+                raise ValueError(f"Corrupt price history file {self.path}")
+        except BaseException:
+            f.close()
+            raise
+        view = memoryview(mapping)
+        cols = {}
+        for i, name in enumerate(self.columns):
+            start = HEADER.size + i * capacity * ITEM
+            cols[name] = view[start:start + capacity * ITEM].cast("d")
+        # Fully built before readers can see it
+        with self.lock:
+            old, self._file = self._file, f
+            self._map, self._cols, self.count, self.capacity = mapping, cols, count, capacity
+        if old is not None:
+            old.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def last_ts(self) -> Optional[float]:
+        return self.last("ts")
+
+    def append(self, ts: float, *values: Optional[float], **named: Optional[float]) -> bool:
+        """
+        Add one row: ts, then the other columns positionally or by name
+        (missing/None → NaN). Out-of-order points (ts before the last one)
+        are rejected.
+        """
+        unknown = set(named) - set(self.columns[1:])
+        if len(values) > len(self.columns) - 1 or unknown:
+            raise TypeError(f"append() got unexpected columns for {self.columns}: {sorted(unknown) or values}")
+        row = dict(zip(self.columns[1:], values))
+        row.update(named)
+        if self.count and ts < self._cols["ts"][self.count - 1]:
+            return False
+        if self.count == self.capacity:
+            self._create(self.capacity * 2, source=self)
+        i = self.count
+        # Slot i is past `count`, so readers cannot see it while it is filled
+        self._cols["ts"][i] = ts
+        for name in self.columns[1:]:
+            self._cols[name][i] = _nan(row.get(name))
+        with self.lock:
+            self.count += 1
+            HEADER.pack_into(self._map, 0, MAGIC, len(self.columns), self.count, self.capacity)
+        return True
+
+    def last(self, column: str) -> Optional[float]:
+        with self.lock:
+            return self._cols[column][self.count - 1] if self.count else None
+
+    def set_last(self, **values: float) -> None:
+        """Overwrite columns of the newest row in place."""
+        with self.lock:
+            for name, value in values.items():
+                self._cols[name][self.count - 1] = value
+
+    def drop_before(self, cutoff: float) -> int:
+        """Rewrite the file without rows older than `cutoff`; returns rows dropped."""
+        start = bisect.bisect_left(self._cols["ts"][:self.count], cutoff)
+        if start == 0:
+            return 0
+        capacity = self.initial_capacity
+        while capacity < self.count - start:
+            capacity *= 2
+        self._create(capacity, source=self, start=start)
+        return start
+
+    def _bounds(self, start: Optional[float], end: Optional[float]):
+        ts = self._cols["ts"][:self.count]
+        lo = 0 if start is None else bisect.bisect_left(ts, start)
+        hi = self.count if end is None else bisect.bisect_right(ts, end)
+        return lo, max(lo, hi)
+
+    def range(self, start: Optional[float] = None, end: Optional[float] = None):
+        """Rows with start <= ts <= end, as zero-copy column views."""
+        with self.lock:
+            lo, hi = self._bounds(start, end)
+            return self.row(*(self._cols[name][lo:hi] for name in self.columns))
+
+    def tail(self, n: int):
+        with self.lock:
+            lo = max(0, self.count - n)
+            return self.row(*(self._cols[name][lo:self.count] for name in self.columns))
+
+    def flush(self) -> None:
+        if self._map is not None:
+            self._map.flush()
+
+    def close(self) -> None:
+        self.flush()
+        with self.lock:
+            self._cols = {}
+            self._map = None
+            self.count = 0
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _file_key(key: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", key)
+
+
+class _SeriesDir:
+    """Lazily opened TokenSeries files of one row type in one directory."""
+
+    def __init__(self, directory: str, row: Type[NamedTuple], initial_capacity: int = INITIAL_CAPACITY):
+        self.directory = directory
+        self.row = row
+        self.initial_capacity = initial_capacity
+        self._open: Dict[str, TokenSeries] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, create: bool = False) -> Optional[TokenSeries]:
+        fk = _file_key(key)
+        with self._lock:
+            s = self._open.get(fk)
+            if s is None:
+                path = os.path.join(self.directory, fk + ".col")
+                if not create and not os.path.exists(path):
+                    return None
+                s = self._open[fk] = TokenSeries(path, self.initial_capacity, row=self.row)
+            return s
+
+    def keys(self) -> List[str]:
+        try:
+            on_disk = {n[:-4] for n in os.listdir(self.directory) if n.endswith(".col")}
+        except OSError:
+            on_disk = set()
+        with self._lock:
+            return sorted(on_disk | set(self._open))
+
+    def close(self) -> None:
+        with self._lock:
+            for s in self._open.values():
+                s.close()
+            self._open.clear()
+
+
+class RollupEngine:
+    """
+    1m/1h/1d OHLC buckets per token, updated in place as points arrive.
+
+    Each new observation touches only the newest bucket of each resolution:
+    it either extends it (high/low/close/vol24) or starts the next one, so
+    history is never rescanned.
+    """
+
+    def __init__(self, directory: str, resolutions: Optional[Dict[str, int]] = None):
+        self.resolutions = dict(resolutions or RESOLUTIONS)
+        self._tiers = {
+            name: _SeriesDir(os.path.join(directory, name), OHLC, initial_capacity=256)
+            for name in self.resolutions
+        }
+
+    def series(self, key: str, resolution: str, create: bool = False) -> Optional[TokenSeries]:
+        return self._tiers[resolution].get(key, create)
+
+    def add(self, key: str, ts: float, price: float, vol24: Optional[float] = None) -> None:
+        for name, step in self.resolutions.items():
+            s = self.series(key, name, create=True)
+            bucket = ts - ts % step
+            last = s.last("ts")
+            if last == bucket:
+                s.set_last(
+                    high=max(s.last("high"), price),
+                    low=min(s.last("low"), price),
+                    close=price,
+                    vol24=s.last("vol24") if vol24 is None else vol24,
+                )
+            elif last is None or bucket > last:
+                s.append(bucket, price, price, price, price, vol24)
+
+    def ohlc(self, key: str, resolution: str, start: Optional[float] = None,
+             end: Optional[float] = None) -> Optional[OHLC]:
+        s = self.series(key, resolution)
+        return s.range(start, end) if s else None
+
+    def high_low(self, key: str, start: float, end: float) -> Optional[Tuple[float, float]]:
+        """
+        High/low over [start, end] at minute precision: minute buckets for
+        the leading partial hour (at most 59) plus hour buckets after it
+        (at most 25 for a day), so the cost does not grow with history.
+        """
+        hour = self.resolutions["1h"]
+        first_full_hour = start + (-start % hour)
+        parts = [
+            self._extremes(key, "1m", start, min(end, first_full_hour - 1)),
+            self._extremes(key, "1h", first_full_hour, end),
+        ]
+        parts = [p for p in parts if p is not None]
+        if not parts:
+            return None
+        return max(high for high, _ in parts), min(low for _, low in parts)
+
+    def _extremes(self, key: str, resolution: str, start: float, end: float) -> Optional[Tuple[float, float]]:
+        """High/low of one tier's buckets, read under the series lock so the writer cannot change them midway."""
+        s = self.series(key, resolution)
+        if s is None:
+            return None
+        with s.lock:
+            window = s.range(start, end)
+            if not len(window):
+                return None
+            return max(window.high), min(window.low)
+
+    def compact(self, now: float, retention: Optional[Dict[str, Optional[float]]] = None) -> int:
+        """Drop buckets past each tier's retention; returns buckets dropped."""
+        retention = RETENTION if retention is None else retention
+        dropped = 0
+        for name, tier in self._tiers.items():
+            keep = retention.get(name)
+            if keep is None:
+                continue
+            for key in tier.keys():
+                dropped += tier.get(key).drop_before(now - keep)
+        return dropped
+
+    def close(self) -> None:
+        for tier in self._tiers.values():
+            tier.close()
+
+
+class PriceHistory:
+    """
+    Raw per-token series plus their rollups, opened lazily and kept open.
+
+    record() never touches the filesystem on the caller's thread: appends
+    (including file creation and capacity doubling), rollup updates and
+    compaction run in order on a single writer thread. Callers should key
+    by the resolved base-token address so a symbol query and its mint share
+    one history.
+    """
+
+    def __init__(self, directory: str = HISTORY_DIR):
+        self.directory = directory
+        self._raw = _SeriesDir(directory, Series)
+        self.rollups = RollupEngine(os.path.join(directory, "rollups"))
+        self._lock = threading.Lock()
+        self._writer: Optional[ThreadPoolExecutor] = None
+
+    @staticmethod
+    def key(token: str) -> str:
+        """Symbols and EVM (0x) addresses are case-insensitive; base58 mints are not."""
+        token = token.strip()
+        if len(token) >= 32 and not token.startswith("0x"):
+            return token
+        return token.lower()
+
+    def series(self, token: str, create: bool = False) -> Optional[TokenSeries]:
+        return self._raw.get(self.key(token), create)
+
+    def _append(self, token: str, ts: float, price: float, change24: Optional[float],
+                vol24: Optional[float]) -> bool:
+        try:
+            if not self.series(token, create=True).append(ts, price, change24=change24, vol24=vol24):
+                return False
+            self.rollups.add(self.key(token), ts, price, vol24)
+            return True
+        except (OSError, ValueError) as e:
+            logger.warning("Could not record price history for %s: %s", token, e)
+            return False
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="price-history")
+            return self._writer
+
+    def record(self, token: str, price: Optional[float], change24: Optional[float] = None,
+               vol24: Optional[float] = None, ts: Optional[float] = None) -> Optional[Future]:
+        """Queue an observation for the writer thread; never blocks or raises into the quote path."""
+        if not token or price is None:
+            return None
+        ts = time.time() if ts is None else ts
+        try:
+            return self._executor().submit(self._append, token, ts, price, change24, vol24)
+        except RuntimeError as e:  # interpreter shutting down
+            logger.warning("Could not queue price history for %s: %s", token, e)
+            return None
+
+    def flush(self) -> None:
+        """Block until every queued observation has been written."""
+        writer = self._writer
+        if writer is not None:
+            writer.submit(lambda: None).result()
+
+    def range(self, token: str, start: Optional[float] = None, end: Optional[float] = None) -> Optional[Series]:
+        s = self.series(token)
+        return s.range(start, end) if s else None
+
+    def ohlc(self, token: str, resolution: str = "1h", start: Optional[float] = None,
+             end: Optional[float] = None) -> Optional[OHLC]:
+        return self.rollups.ohlc(self.key(token), resolution, start, end)
+
+    def high_low_24h(self, token: str, now: Optional[float] = None) -> Optional[Tuple[float, float]]:
+        """(high, low) over the last 24h, answered from rollups."""
+        now = time.time() if now is None else now
+        return self.rollups.high_low(self.key(token), now - 86400, now)
+
+    def _compact(self, now: float) -> int:
+        dropped = 0
+        try:
+            for key in self._raw.keys():
+                dropped += self._raw.get(key).drop_before(now - RETENTION["raw"])
+            dropped += self.rollups.compact(now)
+        except (OSError, ValueError) as e:
+            logger.warning("Price history compaction failed: %s", e)
+        if dropped:
+            logger.info("Price history compaction dropped %d rows", dropped)
+        return dropped
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """
+        Enforce retention: raw points older than RETENTION["raw"] are dropped
+        (they already live on in the rollups, which are updated on every
+        append), then each rollup tier is trimmed. Runs on the writer thread
+        after anything already queued; blocks the caller until done.
+        """
+        now = time.time() if now is None else now
+        return self._executor().submit(self._compact, now).result()
+
+    def tokens(self) -> List[str]:
+        return self._raw.keys()
+
+    def close(self) -> None:
+        """Drain the writer thread, then flush and close every open file."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.shutdown(wait=True)
+        self._raw.close()
+        self.rollups.close()
+
+
+price_history = PriceHistory()
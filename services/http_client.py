@@ -0,0 +1,64 @@
+"""
+Shared async HTTP client — one keep-alive connection pool for all outbound calls.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_HEADERS = {"User-Agent": "Toka420Bot/1.0"}
+LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30)
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the process-wide AsyncClient, creating it on first use.
+
+    The pool is bound to the running event loop; if called from a different
+    loop (e.g. a sync wrapper using asyncio.run), a fresh client is created.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=DEFAULT_TIMEOUT,
+            limits=LIMITS,
+            headers=DEFAULT_HEADERS,
+            follow_redirects=True,
+        )
+        _client_loop = loop
+        logger.debug("Created shared HTTP client")
+    return _client
+
+
+async def get(url: str, *, timeout: Optional[float] = None, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+    """GET a URL through the shared pool and raise on HTTP errors."""
+    kwargs: Dict[str, Any] = {"headers": headers}
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    r = await get_client().get(url, **kwargs)
+    r.raise_for_status()
+    return r
+
+
+async def get_json(url: str, *, timeout: Optional[float] = None, headers: Optional[Dict[str, str]] = None) -> Any:
+    """GET a URL and parse the body as JSON."""
+    r = await get(url, timeout=timeout, headers={"Accept": "application/json", **(headers or {})})
+    return r.json()
+
+
+async def aclose() -> None:
+    """Close the shared client (call on shutdown)."""
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.debug("Closed shared HTTP client")
+    _client = None
+    _client_loop = None
@@ -0,0 +1,193 @@
+"""
+News item index — recent items across all feeds, deduplicated, with
+per-user unseen rotation and a browsing trail for next/prev paging.
+"""
+import hashlib
+import logging
+import re
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from services.feeds import FeedCache, FeedItem
+
+logger = logging.getLogger(__name__)
+
+INDEX_ITEMS_PER_CATEGORY = 100
+TRAIL_LENGTH = 30  # items a user can page back through
+SEEN_PER_USER = 300
+MAX_USERS = 10000
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def item_id(item: FeedItem) -> str:
+    """Short stable id for callback data (Telegram allows 64 bytes)."""
+    return hashlib.sha1(_norm_link(item.link).encode()).hexdigest()[:12]
+
+
+def _norm_link(link: str) -> str:
+    link = link.strip().split("#", 1)[0]
+    if link.startswith("http://"):
+        link = "https://" + link[len("http://"):]
+    return link.rstrip("/")
+
+
+def _title_hash(title: str) -> str:
+    words = " ".join(_WORD_RE.findall(title.lower()))
+    return hashlib.sha1(words.encode()).hexdigest()[:16]
+
+
+class _UserState:
+    __slots__ = ("seen", "trail", "shown")
+
+    def __init__(self):
+        self.seen: "OrderedDict[str, None]" = OrderedDict()
+        self.trail: Deque[Tuple[str, str]] = deque(maxlen=TRAIL_LENGTH)  # (item id, category)
+        self.shown = 0  # items ever appended to the trail; positions are absolute
+
+    def push(self, iid: str, category: str) -> int:
+        self.trail.append((iid, category))
+        self.shown += 1
+        return self.shown - 1
+
+    def at(self, position: int) -> Tuple[str, str]:
+        return self.trail[position - (self.shown - len(self.trail))]
+
+
+class NewsIndex:
+    """
+    Category → recent items, rebuilt from a FeedCache whenever it changes.
+
+    Feeds are merged in configured priority order and deduplicated by
+    normalized link and by title hash, so a story syndicated to several
+    feeds shows up once; each category is then ordered newest first.
+    Users get the newest item they have not been shown yet, and every item
+    shown is appended to their trail so next/prev callbacks can page
+    without touching the network.
+    """
+
+    def __init__(
+        self,
+        cache: FeedCache,
+        categories: Mapping[str, Sequence[str]],
+        *,
+        per_category: int = INDEX_ITEMS_PER_CATEGORY,
+        max_users: int = MAX_USERS,
+    ):
+        self.cache = cache
+        self.categories = {name: list(urls) for name, urls in categories.items()}
+        self.per_category = per_category
+        self.max_users = max_users
+        self._version = -1
+        self._items: Dict[str, FeedItem] = {}
+        self._by_category: Dict[str, List[str]] = {}
+        self._users: "OrderedDict[int, _UserState]" = OrderedDict()
+        self.rebuilds = 0
+        self.duplicates = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _rebuild(self) -> None:
+        if self.cache.version == self._version:
+            return
+        self._version = self.cache.version
+        items: Dict[str, FeedItem] = {}
+        titles: Dict[str, str] = {}
+        by_category: Dict[str, List[str]] = {}
+        duplicates = 0
+        for name, urls in self.categories.items():
+            ids = []
+            for url in urls:
+                entry = self.cache.get(url)
+                for item in entry.items if entry is not None else ():
+                    iid = item_id(item)
+                    th = _title_hash(item.title)
+                    if iid not in items:
+                        # Same story syndicated under another link
+                        iid = titles.get(th, iid)
+                    if iid in items:
+                        duplicates += 1
+                    else:
+                        items[iid] = item
+                        titles[th] = iid
+                    if iid not in ids:
+                        ids.append(iid)
+            # Newest first; undated items sort by when the cache first saw them
+            ids.sort(key=lambda i: -(items[i].published or items[i].seen or 0))
+            by_category[name] = ids[:self.per_category]
+        self._items, self._by_category = items, by_category
+        self.duplicates = duplicates
+        self.rebuilds += 1
+
+    def _user(self, user_id: int) -> _UserState:
+        state = self._users.pop(user_id, None) or _UserState()
+        self._users[user_id] = state
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return state
+
+    def get(self, iid: str) -> Optional[FeedItem]:
+        self._rebuild()
+        return self._items.get(iid)
+
+    def items(self, category: str) -> List[FeedItem]:
+        self._rebuild()
+        return [self._items[i] for i in self._by_category.get(category, [])]
+
+    def next_unseen(self, user_id: int, *categories: str) -> Optional[Tuple[int, str, FeedItem]]:
+        """
+        Newest item in the first of `categories` the user has not seen.
+
+        Marks it seen, appends it to the user's trail and returns
+        (trail position, category, item). Once everything has been seen, the oldest
+        sighting is forgotten so the rotation starts over.
+        """
+        self._rebuild()
+        state = self._user(user_id)
+        for category in categories:
+            ids = self._by_category.get(category, [])
+            if not ids:
+                continue
+            iid = next((i for i in ids if i not in state.seen), None)
+            if iid is None:
+                # Seen it all: show the item seen longest ago again
+                iid = next(i for i in state.seen if i in ids)
+                del state.seen[iid]
+            state.seen[iid] = None
+            while len(state.seen) > SEEN_PER_USER:
+                state.seen.popitem(last=False)
+            return state.push(iid, category), category, self._items[iid]
+        return None
+
+    def page(self, user_id: int, position: int, step: int, *categories: str) -> Optional[Tuple[int, str, FeedItem]]:
+        """
+        Move `step` (±1) from trail `position`.
+
+        Positions are absolute, so buttons on older messages stay valid while
+        the trail keeps only the last TRAIL_LENGTH items. Stepping back walks
+        the trail; stepping forward past its end picks the next unseen item.
+        Items that dropped out of the index are skipped.
+        """
+        self._rebuild()
+        state = self._user(user_id)
+        target = position + step
+        while state.shown - len(state.trail) <= target < state.shown:
+            iid, category = state.at(target)
+            item = self._items.get(iid)
+            if item is not None:
+                return target, category, item
+            target += step
+        if step > 0:
+            return self.next_unseen(user_id, *categories)
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        self._rebuild()
+        return {
+            "items": len(self._items),
+            "duplicates": self.duplicates,
+            "users": len(self._users),
+            "rebuilds": self.rebuilds,
+            **{f"category:{name}": len(ids) for name, ids in self._by_category.items()},
+        }
@@ -0,0 +1,288 @@
+"""
+Outbound send queue — every Bot API request that targets a chat passes
+through one prioritized, rate-paced queue that honours RetryAfter.
+"""
+import os
+import time
+import asyncio
+import logging
+import itertools
+from collections import OrderedDict, deque
+from typing import Any, Callable, Coroutine, Deque, Dict, List, Optional, Set, Tuple
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from services.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Lower sends first
+PRIORITY_RITUAL = 0
+PRIORITY_REPLY = 1  # default for anything not tagged (command replies, edits)
+PRIORITY_ERROR = 2
+PRIORITY_NAMES = {PRIORITY_RITUAL: "ritual", PRIORITY_REPLY: "reply", PRIORITY_ERROR: "error"}
+
+GLOBAL_RATE = float(os.getenv("BROADCAST_RATE", "30"))  # messages/sec for the whole bot (Bot API limit)
+PRIVATE_RATE = 1  # messages/sec to one user
+GROUP_RPM = 20  # messages/min to one group
+CHAT_BURST = 3
+MAX_RETRIES = 3  # RetryAfter reschedules per request before giving up
+MAX_CHAT_BUCKETS = 10000
+WAIT_SAMPLES = 500  # per priority, for wait-time percentiles
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "chat_id", "enqueued", "not_before", "release")
+
+    def __init__(self, priority: int, seq: int, chat_id: Any, enqueued: float, release: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.enqueued = enqueued
+        self.not_before = 0.0
+        self.release = release
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class PriorityRateLimiter(BaseRateLimiter[Dict[str, Any]]):
+    """
+    PTB rate limiter that turns outbound sends into a priority queue.
+
+    Requests carrying a chat_id wait in per-priority FIFO lanes until a
+    dispatcher task releases them: always the highest-priority lane first,
+    skipping chats that already have a request in flight or whose own
+    bucket (1/s private, 20/min groups) is empty, and never faster than the
+    global bucket. A RetryAfter pauses that chat
+    and puts the request back at its original place in its lane, up to
+    max_retries times. Requests without a chat (callback answers, bot
+    metadata) bypass the queue.
+
+    Tag a request with rate_limit_args={"priority": PRIORITY_RITUAL}; the
+    default is PRIORITY_REPLY.
+    """
+
+    def __init__(
+        self,
+        *,
+        rate: float = GLOBAL_RATE,
+        private_rate: float = PRIVATE_RATE,
+        group_rpm: float = GROUP_RPM,
+        burst: float = CHAT_BURST,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self.rate = rate
+        self.private_rate = private_rate
+        self.group_rpm = group_rpm
+        self.burst = burst
+        self.max_retries = max_retries
+        self._global = TokenBucket(rate, capacity=rate)
+        self._chats: "OrderedDict[Any, TokenBucket]" = OrderedDict()
+        self._inflight: Set[Any] = set()  # chats with a request on the wire; one at a time keeps order
+        self._paused: Dict[Any, float] = {}  # chat_id -> monotonic time flood control lifts
+        self._lanes: Dict[int, Deque[_Job]] = {p: deque() for p in PRIORITY_NAMES}
+        self._seq = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._waits: Dict[int, Deque[float]] = {p: deque(maxlen=WAIT_SAMPLES) for p in PRIORITY_NAMES}
+        self.sent = 0
+        self.retried = 0
+        self.gave_up = 0
+        self.bypassed = 0
+
+    # --- BaseRateLimiter --------------------------------------------------
+
+    async def initialize(self) -> None:
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._dispatch())
+            logger.info("Outbound queue started (%.0f msg/s global)", self.rate)
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Let anything still queued go out unpaced rather than hang its caller
+        for lane in self._lanes.values():
+            while lane:
+                job = lane.popleft()
+                if not job.release.done():
+                    job.release.set_result(None)
+        logger.info("Outbound queue stopped (%d sent, %d rescheduled)", self.sent, self.retried)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict[str, Any]],
+    ) -> Any:
+        chat_id = data.get("chat_id")
+        if chat_id is None or self._task is None:
+            self.bypassed += 1
+            return await callback(*args, **kwargs)
+
+        priority = (rate_limit_args or {}).get("priority", PRIORITY_REPLY)
+        loop = asyncio.get_running_loop()
+        job = _Job(priority, next(self._seq), chat_id, time.monotonic(), loop.create_future())
+        for attempt in range(self.max_retries + 1):
+            self._enqueue(job)
+            try:
+                await job.release
+            except asyncio.CancelledError:
+                if job.release.done():
+                    self._done(job)
+                else:
+                    self._discard(job)
+                raise
+            if attempt == 0:
+                self._waits[priority].append(time.monotonic() - job.enqueued)
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    self.gave_up += 1
+                    raise
+                self._retry_after(job, float(e.retry_after))
+                job.release = loop.create_future()
+                continue
+            finally:
+                self._done(job)
+            self.sent += 1
+            return result
+
+    # --- queue ------------------------------------------------------------
+
+    def _enqueue(self, job: _Job) -> None:
+        if self._task is None:
+            # Stopped mid-retry: nothing will dispatch it any more
+            job.release.set_result(None)
+            return
+        lane = self._lanes.setdefault(job.priority, deque())
+        if lane and lane[-1].seq > job.seq:
+            # A rescheduled job goes back ahead of anything queued after it
+            lane.insert(next(i for i, queued in enumerate(lane) if queued.seq > job.seq), job)
+        else:
+            lane.append(job)
+        self._waits.setdefault(job.priority, deque(maxlen=WAIT_SAMPLES))
+        self._wake.set()
+
+    def _done(self, job: _Job) -> None:
+        self._inflight.discard(job.chat_id)
+        if self._wake is not None:
+            self._wake.set()
+
+    def _discard(self, job: _Job) -> None:
+        try:
+            self._lanes[job.priority].remove(job)
+        except ValueError:
+            pass
+
+    def _retry_after(self, job: _Job, seconds: float) -> None:
+        """Flood control: hold the chat (groups share limits per chat) and requeue behind the pause."""
+        resume = time.monotonic() + seconds
+        self._paused[job.chat_id] = max(self._paused.get(job.chat_id, 0.0), resume)
+        job.not_before = resume
+        for chat_id in [c for c, until in self._paused.items() if until <= time.monotonic()]:
+            del self._paused[chat_id]
+        self.retried += 1
+        logger.warning(
+            "Flood control for chat %s: %s send rescheduled in %.1fs",
+            job.chat_id, PRIORITY_NAMES.get(job.priority, job.priority), seconds,
+        )
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            is_group = str(chat_id).startswith("-") or str(chat_id).startswith("@")
+            if is_group:
+                bucket = TokenBucket.per_minute(self.group_rpm, burst=self.burst)
+            else:
+                bucket = TokenBucket(self.private_rate, capacity=self.burst)
+            self._chats[chat_id] = bucket
+            if len(self._chats) > MAX_CHAT_BUCKETS:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    def _next_ready(self, now: float) -> Tuple[Optional[_Job], Optional[float]]:
+        """Highest-priority job that may go now, else the delay until one might."""
+        delay: Optional[float] = None
+        for priority in sorted(self._lanes):
+            blocked = set()  # keep per-chat FIFO: only a chat's oldest job is a candidate
+            for job in self._lanes[priority]:
+                if job.chat_id in blocked or job.chat_id in self._inflight:
+                    continue
+                blocked.add(job.chat_id)
+                wait = max(
+                    job.not_before - now,
+                    self._paused.get(job.chat_id, 0.0) - now,
+                    self._chat_bucket(job.chat_id).wait_time(),
+                )
+                if wait <= 0:
+                    return job, None
+                delay = wait if delay is None else min(delay, wait)
+        return None, delay
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job, delay = self._next_ready(time.monotonic())
+            if job is None:
+                self._wake.clear()
+                timer = loop.call_later(delay, self._wake.set) if delay is not None else None
+                await self._wake.wait()
+                if timer is not None:
+                    timer.cancel()
+                continue
+            wait = self._global.wait_time()
+            if wait > 0:
+                # Re-pick afterwards: a higher-priority job may arrive meanwhile
+                await asyncio.sleep(wait)
+                continue
+            self._global.try_acquire()
+            self._chat_bucket(job.chat_id).try_acquire()
+            self._lanes[job.priority].remove(job)
+            self._inflight.add(job.chat_id)
+            if not job.release.done():
+                job.release.set_result(None)
+
+    # --- metrics ----------------------------------------------------------
+
+    def depth(self) -> Dict[str, int]:
+        return {PRIORITY_NAMES.get(p, str(p)): len(lane) for p, lane in sorted(self._lanes.items())}
+
+    def stats(self) -> Dict[str, Any]:
+        waits = {}
+        for p, samples in sorted(self._waits.items()):
+            values = list(samples)
+            waits[PRIORITY_NAMES.get(p, str(p))] = {
+                "p50": _percentile(values, 0.5),
+                "p95": _percentile(values, 0.95),
+                "max": max(values) if values else None,
+            }
+        return {
+            "depth": self.depth(),
+            "wait": waits,
+            "sent": self.sent,
+            "retried": self.retried,
+            "gave_up": self.gave_up,
+            "bypassed": self.bypassed,
+            "running": self._task is not None and not self._task.done(),
+        }
+
+
+outbox = PriorityRateLimiter()
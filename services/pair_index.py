@@ -0,0 +1,157 @@
+"""
+Persisted query → best-pair resolution index.
+
+Remembers which chain/pair address a query (symbol or address) resolved to,
+so later cache misses can fetch that pair directly in one round-trip.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from config import SETTINGS
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = os.path.join(SETTINGS.DATA_DIR, "pair_index.json")
+INDEX_TTL = 6 * 3600  # re-run full resolution after this long
+INDEX_MAXSIZE = 2048
+SAVE_DELAY = 5.0  # coalesce writes made within this many seconds
+
+
+class PairIndex:
+    """
+    JSON-backed LRU map of query → {"chain", "pair", "ts"}, capped at `maxsize`.
+
+    Entries older than `ttl` are ignored by get() so the caller re-resolves
+    (and may discover a better pair), and are pruned on load and save.
+    Only changed mappings dirty the index; inside an event loop, writes are
+    coalesced for `save_delay` seconds and done in a worker thread. Writes
+    are atomic (tmp file + rename); flush() writes synchronously.
+    """
+
+    def __init__(self, path: str = INDEX_FILE, ttl: float = INDEX_TTL,
+                 maxsize: int = INDEX_MAXSIZE, save_delay: float = SAVE_DELAY):
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.save_delay = save_delay
+        self._entries: Dict[str, Dict] = self._prune(self._load(), time.time())
+        self._dirty = False
+        self._version = 0
+        self._written = 0
+        self._save_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._save_handle: Optional[asyncio.TimerHandle] = None
+        self._write_lock = threading.Lock()
+        self.saves = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                logger.debug("Loaded %d pair index entries from %s", len(data), self.path)
+                return data
+            logger.warning("Ignoring malformed pair index at %s", self.path)
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Could not read pair index %s: %s", self.path, e)
+        return {}
+
+    def _prune(self, entries: Dict[str, Dict], now: float) -> Dict[str, Dict]:
+        """Drop expired entries and keep the `maxsize` most recently resolved."""
+        live = [(k, e) for k, e in entries.items() if now - e.get("ts", 0) < self.ttl]
+        if len(live) > self.maxsize:
+            live.sort(key=lambda kv: kv[1].get("ts", 0))
+            live = live[-self.maxsize:]
+        return dict(live)
+
+    def _write(self, payload: str, version: int) -> None:
+        """Blocking write; an older snapshot never overwrites a newer one."""
+        with self._write_lock:
+            if version <= self._written:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(payload)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logger.warning("Could not persist pair index %s: %s", self.path, e)
+                return
+            self._written = version
+            self.saves += 1
+
+    def _snapshot(self) -> Tuple[str, int]:
+        self._dirty = False
+        self._version += 1
+        return json.dumps(self._prune(self._entries, time.time())), self._version
+
+    def _save_later(self) -> None:
+        self._save_handle = None
+        if self._dirty:
+            payload, version = self._snapshot()
+            asyncio.get_running_loop().run_in_executor(None, self._write, payload, version)
+
+    def _mark_dirty(self) -> None:
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._save_handle is not None and self._save_loop is loop:
+            return
+        self._save_loop = loop
+        self._save_handle = loop.call_later(self.save_delay, self._save_later)
+
+    def flush(self) -> None:
+        """Write pending changes now, from the calling thread."""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        if self._dirty:
+            self._write(*self._snapshot())
+
+    def get(self, query: str, now: Optional[float] = None) -> Optional[Tuple[str, str]]:
+        """Return (chain, pair_address) if the query resolved recently, else None."""
+        key = query.lower()
+        entry = self._entries.get(key)
+        if not entry:
+            return None
+        now = time.time() if now is None else now
+        if now - entry.get("ts", 0) >= self.ttl:
+            logger.debug("Pair index entry for %s due for revalidation", query)
+            return None
+        self._entries[key] = self._entries.pop(key)  # most recently used last
+        return entry["chain"], entry["pair"]
+
+    def put(self, query: str, chain: str, pair: str, now: Optional[float] = None) -> None:
+        if not chain or not pair:
+            return
+        key = query.lower()
+        prev = self._entries.pop(key, None)
+        now = time.time() if now is None else now
+        self._entries[key] = {"chain": chain, "pair": pair, "ts": now}
+        if prev and (prev.get("chain"), prev.get("pair")) == (chain, pair):
+            return  # only the timestamp moved; not worth a write
+        logger.info("Pair index: %s -> %s/%s", query, chain, pair)
+        while len(self._entries) > self.maxsize:
+            self._entries.pop(next(iter(self._entries)))
+        self._mark_dirty()
+
+    def invalidate(self, query: str) -> bool:
+        """Drop the entry for `query` (e.g. when its pair lost liquidity)."""
+        if self._entries.pop(query.lower(), None) is None:
+            return False
+        logger.info("Pair index: invalidated %s", query)
+        self._mark_dirty()
+        return True
@@ -1,26 +1,39 @@
-﻿import time, requests, logging
+﻿import time, logging
 from typing import Optional, Tuple
-from services.storage import KV
+from services.pricelog import price_log
+from services.history import price_history
+from services import http_client
+from services.cache import TTLCache, FRESH, STALE
+from services.singleflight import SingleFlight
 from config import SETTINGS
 log = logging.getLogger("price")
 CACHE_TTL = 60
-_last = {"ts": 0, "q": None, "data": None}
+CACHE_STALE_TTL = 300
+_last = TTLCache(maxsize=256, ttl=CACHE_TTL, stale_ttl=CACHE_STALE_TTL, name="price")
+_inflight = SingleFlight(name="price")
 DEX_URL = "https://api.dexscreener.com/latest/dex/search?q={query}"
-def get_anchor(query: str) -> Optional[Tuple[float,float,float]]:
-    now = time.time()
-    if query == _last["q"] and now - _last["ts"] < CACHE_TTL and _last["data"]:
-        return _last["data"]
+async def _fetch(query: str) -> Optional[Tuple[float,float,float]]:
     try:
-        r = requests.get(DEX_URL.format(query=query), timeout=10); j = r.json()
+        now = time.time()
+        j = await http_client.get_json(DEX_URL.format(query=query), timeout=10)
         first = (j.get("pairs") or [{}])[0]
         price = float(first.get("priceUsd", 0.0))
         pct = float((first.get("priceChange") or {}).get("h24", 0.0))
         vol = float((first.get("volume") or {}).get("h24", 0.0))
         data = (price, pct, vol)
-        _last.update(ts=now, q=query, data=data)
-        KV.log({"t": now, "q": query, "price": price, "pct": pct, "vol": vol})
+        _last.set(query, data, now=now)
+        price_log.write({"t": now, "q": query, "price": price, "pct": pct, "vol": vol})
+        price_history.record((first.get("baseToken") or {}).get("address") or query, price, pct, vol, ts=now)
         return data
     except Exception as e:
         log.warning("dex error: %s", e); return None
+async def get_anchor(query: str) -> Optional[Tuple[float,float,float]]:
+    state, data = _last.lookup(query)
+    if state == FRESH: return data
+    if state == STALE:
+        _inflight.start(query, _fetch, query); return data
+    return await _inflight.do(query, _fetch, query)
+def cache_stats() -> dict:
+    return {**_last.stats(), **_inflight.stats()}
 def default_query(chat_id: int) -> str:
     return SETTINGS.WEEDCOIN_TOKEN or "Weedcoin"
@@ -0,0 +1,242 @@
+"""
+Buffered price log — batches observations in memory and appends them to
+day/size-bounded JSONL segments from a background task.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import functools
+from typing import Any, Dict, List, Optional
+
+from config import SETTINGS
+
+logger = logging.getLogger(__name__)
+
+LOG_DIR = os.path.join(SETTINGS.DATA_DIR, "price_log")
+FLUSH_BATCH = 100  # records
+FLUSH_INTERVAL = 2.0  # seconds
+SEGMENT_MAX_BYTES = 4 * 1024 * 1024
+RETENTION_DAYS = 30  # segments from older UTC days are deleted
+MAX_SEGMENTS = 200  # at most this many segments are kept (~800 MiB)
+
+
+class PriceLogWriter:
+    """
+    Non-blocking append-only log writer.
+
+    write() only appends to an in-memory buffer. A background task flushes
+    when `flush_batch` records are pending or every `flush_interval`
+    seconds, writing the whole batch with one open/write/close in a worker
+    thread. Segments are named `<prefix>-YYYYMMDD-NNN.jsonl` (UTC day) and
+    roll over at the day boundary or once `max_segment_bytes` is reached.
+    After each rollover, segments older than `retention_days` and all but
+    the newest `max_segments` are deleted.
+    Records are never dropped: a failed flush puts the batch back in front,
+    and a write already handed to the worker thread is always accounted for,
+    even if the flushing coroutine is cancelled.
+    """
+
+    def __init__(
+        self,
+        directory: str = LOG_DIR,
+        *,
+        prefix: str = "price_log",
+        flush_batch: int = FLUSH_BATCH,
+        flush_interval: float = FLUSH_INTERVAL,
+        max_segment_bytes: int = SEGMENT_MAX_BYTES,
+        retention_days: int = RETENTION_DAYS,
+        max_segments: int = MAX_SEGMENTS,
+    ):
+        self.directory = directory
+        self.prefix = prefix
+        self.flush_batch = flush_batch
+        self.flush_interval = flush_interval
+        self.max_segment_bytes = max_segment_bytes
+        self.retention_days = retention_days
+        self.max_segments = max_segments
+        self._buffer: List[str] = []
+        self._segment: Optional[str] = None
+        self._segment_day: Optional[str] = None
+        self._segment_seq = 0
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._writing: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.flushes = 0
+        self.errors = 0
+        self.pruned = 0
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """Queue one record; never touches the filesystem."""
+        self._buffer.append(json.dumps(record, separators=(",", ":")))
+        if len(self._buffer) >= self.flush_batch and self._wake is not None:
+            self._wake.set()
+
+    # --- segments ---------------------------------------------------------
+
+    def _segment_path(self, day: str, seq: int) -> str:
+        return os.path.join(self.directory, f"{self.prefix}-{day}-{seq:03d}.jsonl")
+
+    def _open_segment(self, day: str) -> str:
+        """Pick the segment to append to, resuming the newest one of `day` after a restart."""
+        if self._segment_day != day:
+            self._segment_day = day
+            self._segment_seq = 0
+            while os.path.exists(self._segment_path(day, self._segment_seq + 1)):
+                self._segment_seq += 1
+        path = self._segment_path(day, self._segment_seq)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        if size >= self.max_segment_bytes:
+            self._segment_seq += 1
+            path = self._segment_path(day, self._segment_seq)
+        self._segment = path
+        return path
+
+    def segments(self) -> List[str]:
+        """Existing segment files, oldest first."""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(
+            os.path.join(self.directory, n) for n in names
+            if n.startswith(self.prefix + "-") and n.endswith(".jsonl")
+        )
+
+    def _prune(self, current: str, now: float) -> None:
+        """Apply retention; the segment being appended to is never removed."""
+        cutoff = time.strftime("%Y%m%d", time.gmtime(now - self.retention_days * 86400))
+        old = [p for p in self.segments() if p != current]
+        expired = [p for p in old if os.path.basename(p)[len(self.prefix) + 1:][:8] < cutoff]
+        excess = len(old) + 1 - self.max_segments
+        if excess > 0:
+            expired = sorted(set(expired) | set(old[:excess]))
+        for path in expired:
+            try:
+                os.remove(path)
+                self.pruned += 1
+            except OSError as e:
+                logger.warning("Could not remove old price log segment %s: %s", path, e)
+
+    def _write_batch(self, lines: List[str], now: float) -> None:
+        """Blocking part of a flush: append `lines`, splitting across segments as they fill."""
+        os.makedirs(self.directory, exist_ok=True)
+        day = time.strftime("%Y%m%d", time.gmtime(now))
+        start = 0
+        while start < len(lines):
+            previous = self._segment
+            path = self._open_segment(day)
+            if path != previous:
+                self._prune(path, now)
+            with open(path, "a", encoding="utf-8") as f:
+                size = f.tell()
+                end = start
+                while end < len(lines) and (end == start or size < self.max_segment_bytes):
+                    size += len(lines[end]) + 1
+                    end += 1
+                f.write("\n".join(lines[start:end]) + "\n")
+            start = end
+
+    # --- flushing ---------------------------------------------------------
+
+    def flush_sync(self, now: Optional[float] = None) -> int:
+        """Write everything buffered from the calling thread; returns records written."""
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        try:
+            self._write_batch(batch, time.time() if now is None else now)
+        except OSError as e:
+            self._buffer[:0] = batch
+            self.errors += 1
+            logger.warning("Price log flush failed, %d records kept: %s", len(batch), e)
+            return 0
+        self.written += len(batch)
+        self.flushes += 1
+        return len(batch)
+
+    def _write_done(self, batch: List[str], fut: asyncio.Future) -> None:
+        """Account for a worker-thread write; runs on the loop whether or not anyone still awaits it."""
+        error = fut.exception() if not fut.cancelled() else asyncio.CancelledError()
+        if error is not None:
+            self._buffer[:0] = batch
+            self.errors += 1
+            logger.warning("Price log flush failed, %d records kept: %s", len(batch), error)
+            return
+        self.written += len(batch)
+        self.flushes += 1
+
+    async def flush(self) -> int:
+        """Write everything buffered in a worker thread; concurrent flushes are serialized."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # A cancelled earlier flush may have left its write running; never write concurrently
+            if self._writing is not None and not self._writing.done():
+                await asyncio.wait({self._writing})
+            batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            fut = asyncio.get_running_loop().run_in_executor(None, self._write_batch, batch, time.time())
+            fut.add_done_callback(functools.partial(self._write_done, batch))
+            self._writing = fut
+            # wait() does not cancel `fut` if this coroutine is cancelled
+            await asyncio.wait({fut})
+            return 0 if fut.cancelled() or fut.exception() else len(batch)
+
+    async def _loop(self) -> None:
+        logger.info("Price log writer started (%s)", self.directory)
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+        await self.flush()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._stopping = asyncio.Event()
+            self._lock = asyncio.Lock()
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Ask the background task to finish its current flush and exit, then flush the rest."""
+        if self._task is not None:
+            self._stopping.set()
+            self._wake.set()
+            try:
+                await self._task
+            except Exception as e:
+                logger.warning("Price log writer task failed: %s", e)
+            self._task = None
+            self._wake = None
+            self._stopping = None
+        await self.flush()
+        logger.info("Price log writer stopped (%d records written)", self.written)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._buffer),
+            "written": self.written,
+            "flushes": self.flushes,
+            "errors": self.errors,
+            "pruned": self.pruned,
+            "segment": self._segment,
+            "running": self._task is not None and not self._task.done(),
+        }
+
+
+price_log = PriceLogWriter()
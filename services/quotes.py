@@ -0,0 +1,302 @@
+"""
+Multi-provider price quotes — DexScreener and CoinGecko queried concurrently.
+
+get_quote() returns the first valid quote (reconciled for free when every
+provider already has it cached), or, with reconcile=True, the median of
+every quote that arrives within a deadline plus a divergence flag.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import statistics
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from services import http_client
+from services import dexscreener
+from services.cache import TTLCache, FRESH, STALE
+from services.circuit import CircuitBreaker
+from services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+COINGECKO_BASE_URL = os.getenv("COINGECKO_BASE_URL", "https://api.coingecko.com/api/v3")
+COINGECKO_TIMEOUT = 10
+COINGECKO_TTL = 60
+COINGECKO_STALE_TTL = 600  # served while a background refresh runs
+COINGECKO_BREAKER_FAILURES = 3  # free tier rate-limits hard; back off after a few 429s/errors
+COINGECKO_BREAKER_RESET = 120
+RECONCILE_DEADLINE = 1.5  # seconds to wait for a second provider
+DIVERGENCE_THRESHOLD = 0.05  # flag when providers disagree by more than 5%
+
+
+@dataclass(frozen=True)
+class Quote:
+    provider: str
+    symbol: str
+    price_usd: float
+    change24: Optional[float] = None
+    vol24: Optional[float] = None
+    chain: str = ""
+    dex: str = ""
+    sources: Tuple[str, ...] = ()
+    spread: float = 0.0
+    divergent: bool = False
+
+
+def _project_root() -> str:
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def load_coingecko_ids(path: Optional[str] = None) -> Dict[str, str]:
+    """Map lower-cased symbol and name → coingecko_id from media/cannabis_tokens.json."""
+    path = path or os.path.join(_project_root(), "media", "cannabis_tokens.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            tokens = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning("Could not load token registry %s: %s", path, e)
+        return {}
+
+    ids = {}
+    for t in tokens if isinstance(tokens, list) else []:
+        cg_id = t.get("coingecko_id")
+        if not cg_id:
+            continue
+        for key in (t.get("symbol"), t.get("name"), cg_id):
+            if key:
+                ids.setdefault(key.strip().lower(), cg_id)
+    return ids
+
+
+class PriceProvider(ABC):
+    """A source of USD quotes. quote() returns None when the token is unknown or the call fails."""
+
+    name = "provider"
+
+    def supports(self, token: str) -> bool:
+        return True
+
+    @abstractmethod
+    async def quote(self, token: str) -> Optional[Quote]:
+        ...
+
+    def cached(self, token: str) -> Optional[Quote]:
+        """A fresh quote available without any network call, if the provider keeps one."""
+        return None
+
+
+class DexScreenerProvider(PriceProvider):
+    """Quotes from the cached DexScreener pair lookup."""
+
+    name = "dexscreener"
+
+    async def quote(self, token: str) -> Optional[Quote]:
+        return self._to_quote(token, await dexscreener.get_pair(token))
+
+    def cached(self, token: str) -> Optional[Quote]:
+        return self._to_quote(token, dexscreener.cached_pair(token))
+
+    def _to_quote(self, token: str, pair) -> Optional[Quote]:
+        if not pair or pair.price_usd is None:
+            return None
+        return Quote(
+            provider=self.name,
+            symbol=pair.symbol or token.upper(),
+            price_usd=pair.price_usd,
+            change24=pair.change24,
+            vol24=pair.vol24,
+            chain=pair.chain,
+            dex=pair.dex,
+            sources=(self.name,),
+        )
+
+
+class CoinGeckoProvider(PriceProvider):
+    """
+    Quotes from CoinGecko /simple/price for tokens with a known coingecko_id.
+
+    Stale quotes are served while a background refresh runs, and a circuit
+    breaker stops calling the (rate-limited) free tier after repeated
+    failures until it has had time to recover.
+    """
+
+    name = "coingecko"
+    PRICE_PATH = "/simple/price?ids={id}&vs_currencies=usd&include_24hr_change=true&include_24hr_vol=true"
+
+    def __init__(self, ids: Optional[Dict[str, str]] = None, base_url: Optional[str] = None,
+                 ttl: float = COINGECKO_TTL, stale_ttl: float = COINGECKO_STALE_TTL):
+        self.ids = load_coingecko_ids() if ids is None else ids
+        self.base_url = (base_url or COINGECKO_BASE_URL).rstrip("/")
+        self._cache = TTLCache(maxsize=128, ttl=ttl, stale_ttl=stale_ttl, name="coingecko")
+        self._inflight = SingleFlight(name="coingecko")
+        self._breaker = CircuitBreaker(
+            failure_threshold=COINGECKO_BREAKER_FAILURES, reset_timeout=COINGECKO_BREAKER_RESET, name="coingecko"
+        )
+
+    def supports(self, token: str) -> bool:
+        return token.strip().lower() in self.ids
+
+    async def _fetch(self, cg_id: str) -> Optional[Quote]:
+        if not self._breaker.allow():
+            logger.debug("CoinGecko circuit open, skipping %s", cg_id)
+            return None
+        url = self.base_url + self.PRICE_PATH.format(id=cg_id)
+        try:
+            j = await http_client.get_json(url, timeout=COINGECKO_TIMEOUT)
+        except (httpx.HTTPError, ValueError) as e:
+            self._breaker.record_failure()
+            logger.warning("CoinGecko error for %s: %s", cg_id, e)
+            return None
+        except asyncio.CancelledError:
+            self._breaker.record_cancel()
+            raise
+        self._breaker.record_success()
+
+        row = (j or {}).get(cg_id) or {}
+        if row.get("usd") is None:
+            return None
+        q = Quote(
+            provider=self.name,
+            symbol=cg_id.upper(),
+            price_usd=float(row["usd"]),
+            change24=row.get("usd_24h_change"),
+            vol24=row.get("usd_24h_vol"),
+            sources=(self.name,),
+        )
+        self._cache.set(cg_id, q)
+        return q
+
+    async def quote(self, token: str) -> Optional[Quote]:
+        cg_id = self.ids.get(token.strip().lower())
+        if not cg_id:
+            return None
+        state, cached = self._cache.lookup(cg_id)
+        if state == FRESH:
+            return cached
+        if state == STALE:
+            self._inflight.start(cg_id, self._fetch, cg_id)
+            return cached
+        return await self._inflight.do(cg_id, self._fetch, cg_id)
+
+    def cached(self, token: str) -> Optional[Quote]:
+        cg_id = self.ids.get(token.strip().lower())
+        left = self._cache.expires_in(cg_id) if cg_id else None
+        return self._cache.peek(cg_id) if left is not None and left > 0 else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._cache.stats(), "circuit": self._breaker.stats()["state"]}
+
+
+PROVIDERS: List[PriceProvider] = [DexScreenerProvider(), CoinGeckoProvider()]
+
+
+def reconcile_quotes(quotes: Sequence[Quote], threshold: float = DIVERGENCE_THRESHOLD) -> Quote:
+    """Combine quotes into one: median price, spread relative to it, divergence flag."""
+    first = quotes[0]
+    if len(quotes) == 1:
+        return first
+    prices = [q.price_usd for q in quotes]
+    median = statistics.median(prices)
+    spread = (max(prices) - min(prices)) / median if median else 0.0
+    if spread > threshold:
+        logger.warning("Provider divergence for %s: %s", first.symbol, {q.provider: q.price_usd for q in quotes})
+
+    # Descriptive fields come from the DEX quote when present (it knows chain/dex)
+    base = next((q for q in quotes if q.dex), first)
+    return Quote(
+        provider="median",
+        symbol=base.symbol,
+        price_usd=median,
+        change24=base.change24,
+        vol24=base.vol24,
+        chain=base.chain,
+        dex=base.dex,
+        sources=tuple(q.provider for q in quotes),
+        spread=spread,
+        divergent=spread > threshold,
+    )
+
+
+async def _safe_quote(provider: PriceProvider, token: str) -> Optional[Quote]:
+    try:
+        q = await provider.quote(token)
+    except Exception as e:
+        logger.warning("Provider %s failed for %s: %s", provider.name, token, e)
+        return None
+    return q if q and q.price_usd > 0 else None
+
+
+async def get_quote(
+    token: str,
+    *,
+    reconcile: bool = False,
+    deadline: float = RECONCILE_DEADLINE,
+    providers: Optional[Sequence[PriceProvider]] = None,
+) -> Optional[Quote]:
+    """
+    Query every provider that supports `token` concurrently.
+
+    Returns as soon as the first valid quote arrives, unless every provider
+    already has a fresh cached quote: then they are reconciled with no
+    network call. With reconcile=True (an explicit request to compare),
+    keeps waiting until `deadline` seconds after the start for the others
+    and returns reconcile_quotes() over all that made it. Pending provider
+    calls are cancelled before returning.
+    """
+    providers = [p for p in (PROVIDERS if providers is None else providers) if p.supports(token)]
+    if not providers:
+        return None
+
+    cached = [p.cached(token) for p in providers]
+    if all(cached) and len(cached) > 1:
+        return reconcile_quotes(cached)
+
+    start = time.monotonic()
+    tasks = {asyncio.ensure_future(_safe_quote(p, token)): p for p in providers}
+    pending = set(tasks)
+    quotes: List[Quote] = []
+    try:
+        while pending:
+            timeout = None
+            if quotes:
+                timeout = deadline - (time.monotonic() - start)
+                if timeout <= 0:
+                    break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                q = task.result()
+                if q:
+                    quotes.append(q)
+            if quotes and not reconcile:
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if not quotes:
+        logger.warning("No provider returned a quote for %s", token)
+        return None
+    return reconcile_quotes(quotes) if reconcile else quotes[0]
+
+
+def quote_to_anchor(q: Quote) -> Optional[dict]:
+    """Render a Quote with the same keys/format as dexscreener.get_anchor()."""
+    pair = dexscreener.Pair(
+        symbol=q.symbol, address="", chain=q.chain, dex=q.dex, pair_address="",
+        price_usd=q.price_usd, price_native=None, change24=q.change24, vol24=q.vol24,
+        liquidity_usd=None,
+    )
+    anchor = dexscreener._format_anchor(pair)
+    if anchor:
+        anchor["sources"] = list(q.sources)
+        anchor["divergent"] = q.divergent
+        anchor["spread"] = q.spread
+    return anchor
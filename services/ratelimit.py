@@ -0,0 +1,56 @@
+"""
+Token-bucket rate limiting for upstream APIs.
+"""
+import time
+import asyncio
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens are added per second up to `capacity`.
+
+    try_acquire() never blocks; acquire() sleeps until enough tokens exist.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("rate and capacity must be positive")
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._ts = clock()
+
+    @classmethod
+    def per_minute(cls, rpm: float, burst: Optional[float] = None, **kwargs) -> "TokenBucket":
+        return cls(rate=rpm / 60.0, capacity=burst or rpm, **kwargs)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        elapsed = now - self._ts
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._ts = now
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def wait_time(self, n: float = 1) -> float:
+        """Seconds until `n` tokens are available (0 if available now)."""
+        self._refill()
+        missing = n - self._tokens
+        return max(0.0, missing / self.rate)
+
+    def try_acquire(self, n: float = 1) -> bool:
+        self._refill()
+        if self._tokens >= n:
+            self._tokens -= n
+            return True
+        return False
+
+    async def acquire(self, n: float = 1) -> None:
+        while not self.try_acquire(n):
+            await asyncio.sleep(self.wait_time(n))
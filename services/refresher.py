@@ -0,0 +1,171 @@
+"""
+Popularity-driven background price refresher.
+
+Tracks how often each token is requested and re-fetches the hottest ones
+shortly before their cache entries expire, within an upstream budget.
+"""
+import math
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from services.cache import TTLCache
+from services.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class PopularityTracker:
+    """
+    Exponentially decayed request counter per key.
+
+    With half-life `h`, a steady stream of r requests/sec converges to a
+    score of r * h / ln 2, so rate() recovers an estimate of r.
+    """
+
+    def __init__(self, half_life: float = 600, maxsize: int = 512):
+        self.half_life = half_life
+        self.maxsize = maxsize
+        self._scores: Dict[Hashable, Tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def _decayed(self, key: Hashable, now: float) -> float:
+        entry = self._scores.get(key)
+        if entry is None:
+            return 0.0
+        score, ts = entry
+        return score * math.pow(2.0, -(now - ts) / self.half_life)
+
+    def record(self, key: Hashable, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        self._scores[key] = (self._decayed(key, now) + 1.0, now)
+        if len(self._scores) > self.maxsize:
+            coldest = min(self._scores, key=lambda k: self._decayed(k, now))
+            del self._scores[coldest]
+
+    def rate(self, key: Hashable, now: Optional[float] = None) -> float:
+        """Estimated requests per second for `key`."""
+        now = time.time() if now is None else now
+        return self._decayed(key, now) * math.log(2) / self.half_life
+
+    def top(self, n: int, now: Optional[float] = None) -> List[Tuple[Hashable, float]]:
+        """The `n` most requested keys with their estimated requests/sec."""
+        now = time.time() if now is None else now
+        rates = [(k, self.rate(k, now)) for k in self._scores]
+        rates.sort(key=lambda kv: kv[1], reverse=True)
+        return rates[:n]
+
+
+class PriceRefresher:
+    """
+    Background task that keeps hot cache entries fresh.
+
+    A token is refreshed when its entry is within `lead` seconds of expiring
+    (or already gone) and it is expected to be requested at least
+    `min_expected` times per cache TTL. The loop sleeps until the next hot
+    entry is due, so the refresh rate follows request frequency, and every
+    refresh draws from a global requests-per-minute budget.
+    """
+
+    def __init__(
+        self,
+        tracker: PopularityTracker,
+        cache: TTLCache,
+        refresh: Callable[[Hashable], Awaitable[Any]],
+        *,
+        top_n: int = 10,
+        rpm: float = 30,
+        lead: float = 10,
+        min_expected: float = 1.0,
+        min_tick: float = 1.0,
+        max_tick: float = 30.0,
+        skip: Optional[Callable[[Hashable], bool]] = None,
+    ):
+        self.tracker = tracker
+        self.cache = cache
+        self.refresh = refresh
+        self.top_n = top_n
+        self.lead = lead
+        self.min_expected = min_expected
+        self.min_tick = min_tick
+        self.max_tick = max_tick
+        self.skip = skip
+        self.budget = TokenBucket.per_minute(rpm)
+        self.refreshes = 0
+        self.budget_skips = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def plan(self, now: Optional[float] = None) -> Tuple[List[Hashable], float]:
+        """Return (keys due for refresh, hottest first) and seconds until the next check."""
+        now = time.time() if now is None else now
+        due = []
+        next_check = self.max_tick
+        for key, rate in self.tracker.top(self.top_n, now):
+            if rate * self.cache.ttl < self.min_expected:
+                continue
+            if self.skip is not None and self.skip(key):
+                continue
+            remaining = self.cache.expires_in(key, now)
+            if remaining is None or remaining <= self.lead:
+                due.append(key)
+            else:
+                next_check = min(next_check, remaining - self.lead)
+        return due, max(self.min_tick, next_check)
+
+    async def run_once(self, now: Optional[float] = None) -> Tuple[List[Hashable], float]:
+        """Refresh every due key the budget allows; return (refreshed keys, next sleep)."""
+        due, sleep_for = self.plan(now)
+        granted = []
+        for key in due:
+            if not self.budget.try_acquire():
+                self.budget_skips += len(due) - len(granted)
+                logger.debug("Refresh budget exhausted, deferring %d tokens", len(due) - len(granted))
+                sleep_for = min(sleep_for, max(self.min_tick, self.budget.wait_time()))
+                break
+            granted.append(key)
+
+        if granted:
+            results = await asyncio.gather(*(self.refresh(k) for k in granted), return_exceptions=True)
+            for key, result in zip(granted, results):
+                if isinstance(result, Exception):
+                    logger.warning("Background refresh failed for %s: %s", key, result)
+            self.refreshes += len(granted)
+            logger.debug("Refreshed %d hot tokens: %s", len(granted), granted)
+        return granted, sleep_for
+
+    async def _loop(self) -> None:
+        logger.info("Price refresher started (top_n=%d, rpm=%.0f)", self.top_n, self.budget.rate * 60)
+        while True:
+            try:
+                _, sleep_for = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("Price refresher iteration failed: %s", e)
+                sleep_for = self.max_tick
+            await asyncio.sleep(sleep_for)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Price refresher stopped")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tracked": len(self.tracker),
+            "refreshes": self.refreshes,
+            "budget_skips": self.budget_skips,
+            "running": self._task is not None and not self._task.done(),
+        }
@@ -4,7 +4,7 @@ import json
 import logging
 from typing import Any, Dict, List, Optional
 
-from services.dexscreener import get_anchor
+from services.dexscreener import get_anchor, is_address
 
 logger = logging.getLogger(__name__)
 
@@ -74,22 +74,26 @@ def load_media_bank() -> Dict[str, List[Any]]:
 MEDIA = load_media_bank()
 
 
-def kiss_anchor(token_id: Optional[str]):
+def _anchor_line(token_id: str, data: Optional[Dict[str, Any]]) -> str:
+    """Render one anchor dict as the compact ritual/status line."""
+    if not data:
+        logger.debug("No price data for %s", token_id)
+        return f"{token_id}: price n/a | vol n/a | 24h +/-0.00%"
+
+    # Be defensive with keys
+    symbol = data.get("symbol", token_id)
+    change24 = data.get("change24", "24h +/-0.00%")
+    price = data.get("price", "price n/a")
+    vol24 = data.get("vol24", "vol n/a")
+
+    return f"{symbol}: {change24} | {price} | 24h vol {vol24}"
+
+
+async def kiss_anchor(token_id: Optional[str]):
     """Get formatted price anchor for a token."""
     token_id = (token_id or DEFAULT_TOKEN).strip()
     try:
-        data = get_anchor(token_id)
-        if not data:
-            logger.debug("No price data for %s", token_id)
-            return f"{token_id}: price n/a | vol n/a | 24h +/-0.00%"
-
-        # Be defensive with keys
-        symbol = data.get("symbol", token_id)
-        change24 = data.get("change24", "24h +/-0.00%")
-        price = data.get("price", "price n/a")
-        vol24 = data.get("vol24", "vol n/a")
-
-        return f"{symbol}: {change24} | {price} | 24h vol {vol24}"
+        return _anchor_line(token_id, await get_anchor(token_id))
     except Exception as e:
         logger.exception("Error getting anchor for %s: %s", token_id, e)
         return f"{token_id}: price n/a | vol n/a | 24h +/-0.00%"
@@ -109,7 +113,7 @@ def _normalize_hub_fields(hub: Any, hub_name: Optional[str], city: Optional[str]
     return hub_name, city, tier, None
 
 
-def build_ritual_text(
+async def build_ritual_text(
     hub: Any = None,
     token_id: Optional[str] = None,
     *,
@@ -121,10 +125,10 @@ def build_ritual_text(
     Build the formatted ritual message.
 
     New usage (recommended):
-      build_ritual_text(hub_dict, token_id=..., city=...)
+      await build_ritual_text(hub_dict, token_id=..., city=...)
 
     Backward-compatible usage:
-      build_ritual_text(hub_name="America/New_York", token_id=...)
+      await build_ritual_text(hub_name="America/New_York", token_id=...)
     """
     try:
         from services.navigator_blessing import get_blessing
@@ -144,9 +148,12 @@ def build_ritual_text(
         token_symbol = (token_obj.get("symbol") or "WEEDCOIN").strip()
         token_name = (token_obj.get("name") or "Weedcoin").strip()
 
-        # Prefer explicit token_id argument if provided
+        # Prefer explicit token_id argument if provided; a registry mint beats the symbol (no collisions)
         anchor_token_id = (token_id or token_symbol or DEFAULT_TOKEN).lower()
-        anchor = kiss_anchor(anchor_token_id)
+        mint = (token_obj.get("mint") or "").strip()
+        if is_address(mint) and anchor_token_id == token_symbol.lower():
+            anchor_token_id = mint
+        anchor = await kiss_anchor(anchor_token_id)
 
         safety = _pick(MEDIA.get("safety", []), "DYOR | Use 2FA | Secure your keys")
 
@@ -1,15 +1,26 @@
 import os
+import time
+import asyncio
 import logging
 import datetime as dt
+from collections import deque
+from typing import Any, Deque, Dict, NamedTuple, Optional
+
 import pytz
 
+from services.broadcast import broadcaster, load_targets
 from services.ritual import build_ritual_text
+from services.storage import get_store
 
 logger = logging.getLogger(__name__)
 
 
 _EPOCH = dt.date(2024, 1, 1)
 
+RITUAL_TIME = dt.time(hour=4, minute=20)
+PREPARE_LEAD = 60  # seconds before RITUAL_TIME the message is rendered
+DRIFT_SAMPLES = 30  # per timezone, persisted under ritual:drift:<tz>
+
 
 def _date_index_for_tz(tz_name: str) -> int:
     tz = pytz.timezone(tz_name)
@@ -23,9 +34,146 @@ def _pick_rotating(items, idx: int):
     return items[idx % len(items)]
 
 
+def ritual_instant(tz_name: str, now: Optional[dt.datetime] = None) -> dt.datetime:
+    """Today's 04:20:00 in `tz_name` (the instant the send job is scheduled for)."""
+    tz = pytz.timezone(tz_name)
+    local = (now or dt.datetime.now(dt.timezone.utc)).astimezone(tz)
+    return tz.localize(dt.datetime.combine(local.date(), RITUAL_TIME))
+
+
+class PreparedRitual(NamedTuple):
+    day: int  # _date_index_for_tz at prepare time
+    hub_id: str
+    city: Optional[str]
+    chats: Dict[str, str]  # chat_id -> token_id
+    texts: Dict[str, str]  # token_id -> rendered message, shared by every chat using that token
+
+
+# tz -> ritual rendered by the prepare phase, consumed by the send phase
+_prepared: Dict[str, PreparedRitual] = {}
+
+
+class DriftTracker:
+    """
+    Per-timezone delivery drift: seconds between the scheduled 04:20:00 and
+    Telegram acknowledging the send. Keeps the last DRIFT_SAMPLES samples per
+    timezone and writes them behind to the KV store.
+    """
+
+    def __init__(self, samples: int = DRIFT_SAMPLES):
+        self.samples = samples
+        self._drift: Dict[str, Deque[float]] = {}
+        self._loaded = False
+
+    def _series(self, tz_name: str) -> Deque[float]:
+        if not self._loaded:
+            self._loaded = True
+            try:
+                for key, values in get_store().items("ritual:drift:"):
+                    self._drift[key[len("ritual:drift:"):]] = deque(values, maxlen=self.samples)
+            except Exception as e:
+                logger.warning("Could not load ritual drift history: %s", e)
+        return self._drift.setdefault(tz_name, deque(maxlen=self.samples))
+
+    def record(self, tz_name: str, drift: float) -> None:
+        series = self._series(tz_name)
+        series.append(round(drift, 3))
+        values = list(series)
+        try:
+            asyncio.get_running_loop().run_in_executor(None, get_store().set, f"ritual:drift:{tz_name}", values)
+        except RuntimeError:
+            get_store().set(f"ritual:drift:{tz_name}", values)
+
+    def stats(self) -> Dict[str, Any]:
+        self._series("")  # make sure persisted history is loaded
+        per_tz = {tz: list(v) for tz, v in self._drift.items() if v}
+        samples = sorted(abs(x) for v in per_tz.values() for x in v)
+        return {
+            "timezones": len(per_tz),
+            "last": {tz: v[-1] for tz, v in per_tz.items()},
+            "p50": samples[len(samples) // 2] if samples else None,
+            "max": samples[-1] if samples else None,
+        }
+
+
+drift_tracker = DriftTracker()
+
+
+def _plan(context) -> Optional[Dict[str, Any]]:
+    """Validate the job payload and pick today's hub, city and token for its timezone."""
+    payload = getattr(context, "job", None).data if getattr(context, "job", None) else None
+    if not isinstance(payload, dict):
+        logger.error("Ritual payload missing or invalid (context.job.data).")
+        return None
+
+    tz_name = payload.get("tz")
+    hubs = payload.get("hubs") or []
+    if not tz_name or not isinstance(hubs, list) or not hubs:
+        logger.error("Ritual payload must include tz and non-empty hubs list. payload=%s", payload)
+        return None
+
+    # Global token override (optional)
+    token_id = (
+        context.application.bot_data.get("token_override")
+        if getattr(context, "application", None)
+        else None
+    ) or os.getenv("DEFAULT_TOKEN", "weedcoin")
+
+    day_idx = _date_index_for_tz(tz_name)
+
+    # Policy B: rotate hubs daily within the timezone (everyone eats)
+    chosen_hub = _pick_rotating(hubs, day_idx)
+    if not isinstance(chosen_hub, dict):
+        logger.error("Chosen hub invalid. tz=%s chosen=%s", tz_name, chosen_hub)
+        return None
+
+    cities = chosen_hub.get("cities") or []
+    targets = [t for t in load_targets() if t.wants(tz_name)]
+    return {
+        "tz": tz_name,
+        "day": day_idx,
+        "hub": chosen_hub,
+        "city": _pick_rotating(cities, day_idx),
+        "token_id": token_id,
+        # chat_id -> token; chats without a token override use the global one
+        "chats": {t.chat_id: t.token or token_id for t in targets},
+    }
+
+
+async def _render(plan: Dict[str, Any]) -> PreparedRitual:
+    """Render once per distinct token among the plan's chats, not once per chat."""
+    hub = plan["hub"]
+    tokens = sorted(set(plan["chats"].values()))
+    texts = await asyncio.gather(*(
+        build_ritual_text(hub, token_id=token_id, city=plan["city"], tier=hub.get("tier", ""))
+        for token_id in tokens
+    ))
+    return PreparedRitual(plan["day"], hub.get("hub", "hub"), plan["city"], plan["chats"], dict(zip(tokens, texts)))
+
+
+async def prepare_ritual(context):
+    """
+    Phase 1, PREPARE_LEAD seconds before 4:20: rotate hub/city, fetch the
+    anchor and render the full message so the send phase only has to send.
+    """
+    try:
+        plan = _plan(context)
+        if plan is None:
+            return
+        started = time.monotonic()
+        _prepared[plan["tz"]] = await _render(plan)
+        logger.info(
+            "Ritual prepared tz=%s hub=%s city=%s tokens=%s chats=%d in %.2fs",
+            plan["tz"], plan["hub"].get("hub"), plan["city"], ",".join(_prepared[plan["tz"]].texts),
+            len(plan["chats"]), time.monotonic() - started,
+        )
+    except Exception as e:
+        logger.exception("Ritual prepare failed: %s", e)
+
+
 async def ritual_call(context):
     """
-    Executes the 4:20 ritual for a TIMEZONE job.
+    Executes the 4:20 ritual for a TIMEZONE job (phase 2: send).
 
     context.job.data must include:
       - tz: str
@@ -35,65 +183,39 @@ async def ritual_call(context):
           - cities: list[str]
           - tz: str
     Scheduler chooses the TIMEZONE; this function rotates which HUB and CITY gets the blessing.
+    The ritual goes to every chat that takes this timezone (see services.broadcast).
+    Messages normally come from prepare_ritual; anything not prepared today is rendered here.
     """
     try:
         payload = getattr(context, "job", None).data if getattr(context, "job", None) else None
-        if not isinstance(payload, dict):
+        tz_name = payload.get("tz") if isinstance(payload, dict) else None
+        if not tz_name:
             logger.error("Ritual payload missing or invalid (context.job.data).")
             return
-
-        tz_name = payload.get("tz")
-        hubs = payload.get("hubs") or []
-        if not tz_name or not isinstance(hubs, list) or not hubs:
-            logger.error("Ritual payload must include tz and non-empty hubs list. payload=%s", payload)
-            return
-
-        # Global token override (optional)
-        token_id = (
-            context.application.bot_data.get("token_override")
-            if getattr(context, "application", None)
-            else None
-        ) or os.getenv("DEFAULT_TOKEN", "weedcoin")
-
-        chat_id = os.getenv("TELEGRAM_GLOBAL_CHAT_ID")
-        if not chat_id:
-            logger.error("TELEGRAM_GLOBAL_CHAT_ID not set. Cannot send ritual for tz=%s", tz_name)
-            return
-
-        day_idx = _date_index_for_tz(tz_name)
-
-        # Policy B: rotate hubs daily within the timezone (everyone eats)
-        chosen_hub = _pick_rotating(hubs, day_idx)
-        if not isinstance(chosen_hub, dict):
-            logger.error("Chosen hub invalid. tz=%s chosen=%s", tz_name, chosen_hub)
+        scheduled = ritual_instant(tz_name)
+
+        prepared = _prepared.pop(tz_name, None)
+        if prepared is None or prepared.day != _date_index_for_tz(tz_name):
+            logger.warning("No prepared ritual for tz=%s, rendering at send time", tz_name)
+            plan = _plan(context)
+            if plan is None:
+                return
+            prepared = await _render(plan)
+
+        if not prepared.chats:
+            logger.info("No chats take the ritual for tz=%s", tz_name)
             return
 
-        cities = chosen_hub.get("cities") or []
-        chosen_city = _pick_rotating(cities, day_idx)
-
-        hub_id = chosen_hub.get("hub", "hub")
-        tier = chosen_hub.get("tier", "")
+        deliveries = [(chat_id, prepared.texts[token_id]) for chat_id, token_id in prepared.chats.items()]
+        result = await broadcaster.fan_out(context.bot, deliveries)
 
+        # Drift until the last chat's send was acknowledged
+        drift = time.time() - scheduled.timestamp()
+        drift_tracker.record(tz_name, drift)
         logger.info(
-            "Ritual start tz=%s hub=%s tier=%s city=%s token=%s",
-            tz_name,
-            hub_id,
-            tier,
-            chosen_city,
-            token_id,
-        )
-
-        # Build message using new hub model
-        text = build_ritual_text(
-            chosen_hub,
-            token_id=token_id,
-            city=chosen_city,
-            tier=tier,
+            "Ritual sent tz=%s hub=%s city=%s chats=%d failed=%d drift=%.3fs",
+            tz_name, prepared.hub_id, prepared.city, result["sent"], result["failed"], drift,
         )
 
-        await context.bot.send_message(chat_id=chat_id, text=text)
-
-        logger.info("Ritual sent tz=%s hub=%s city=%s", tz_name, hub_id, chosen_city)
-
     except Exception as e:
         logger.exception("Ritual failed: %s", e)
@@ -0,0 +1,163 @@
+"""
+Per-user rotation counters — bounded in memory, persisted in the KV store.
+"""
+import os
+import time
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from services.storage import KVStore, get_store
+
+logger = logging.getLogger(__name__)
+
+ROTATION_MAX_USERS = int(os.getenv("ROTATION_MAX_USERS", "10000"))
+ROTATION_IDLE_DAYS = float(os.getenv("ROTATION_IDLE_DAYS", "30"))
+FLUSH_INTERVAL = 30.0  # seconds between write-behind flushes
+
+
+class UserRotation:
+    """
+    user_id → (call count, last seen) with LRU and idle-time eviction.
+
+    Holds at most `maxsize` users; users idle longer than `idle_ttl` are
+    dropped when next touched or by prune(). Changes are written behind to
+    the KV store under `<namespace>:<user_id>` (evictions delete their row),
+    so rotations survive restarts without a write per call.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        *,
+        maxsize: int = ROTATION_MAX_USERS,
+        idle_ttl: float = ROTATION_IDLE_DAYS * 86400,
+        store: Callable[[], KVStore] = get_store,
+        flush_interval: float = FLUSH_INTERVAL,
+    ):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.idle_ttl = idle_ttl
+        self.flush_interval = flush_interval
+        self._store = store
+        self._users: "OrderedDict[int, Tuple[int, float]]" = OrderedDict()
+        self._dirty: Set[int] = set()
+        self._deleted: Set[int] = set()
+        self._loaded = False
+        self._last_flush = time.monotonic()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"rotation-{namespace}")
+        self._flushing: Optional[Future] = None
+        self.lookups = 0
+        self.lru_evictions = 0
+        self.idle_evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.namespace}:{user_id}"
+
+    def _load(self, now: float) -> None:
+        self._loaded = True
+        prefix = self.namespace + ":"
+        try:
+            rows = [(int(k[len(prefix):]), v) for k, v in self._store().items(prefix)]
+        except Exception as e:
+            logger.warning("Could not load %s rotation state: %s", self.namespace, e)
+            return
+        rows.sort(key=lambda kv: kv[1].get("seen", 0))
+        overflow = max(0, len(rows) - self.maxsize)
+        self._deleted.update(user_id for user_id, _ in rows[:overflow])
+        for user_id, v in rows[overflow:]:
+            self._users[user_id] = (int(v.get("count", 0)), float(v.get("seen", now)))
+        self.prune(now)
+        logger.info("Loaded %d %s rotation entries", len(self._users), self.namespace)
+
+    def _evict(self, user_id: int) -> None:
+        del self._users[user_id]
+        self._dirty.discard(user_id)
+        self._deleted.add(user_id)
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Drop users idle for longer than idle_ttl (oldest first, so this stops early)."""
+        now = time.time() if now is None else now
+        dropped = 0
+        while self._users:
+            user_id, (_, seen) = next(iter(self._users.items()))
+            if now - seen < self.idle_ttl:
+                break
+            self._evict(user_id)
+            dropped += 1
+        self.idle_evictions += dropped
+        return dropped
+
+    def next(self, user_id: int, now: Optional[float] = None) -> int:
+        """Return how many times `user_id` called before, and count this call."""
+        now = time.time() if now is None else now
+        if not self._loaded:
+            self._load(now)
+        self.prune(now)  # an idle caller starts the rotation over
+        self.lookups += 1
+        count, _ = self._users.pop(user_id, (0, now))
+        self._users[user_id] = (count + 1, now)
+        self._dirty.add(user_id)
+        self._deleted.discard(user_id)
+        while len(self._users) > self.maxsize:
+            self._evict(next(iter(self._users)))
+            self.lru_evictions += 1
+        self._maybe_flush()
+        return count
+
+    # --- persistence ------------------------------------------------------
+
+    def _pending(self) -> Tuple[Dict[str, Any], Set[str]]:
+        writes = {
+            self._key(u): {"count": self._users[u][0], "seen": self._users[u][1]}
+            for u in self._dirty if u in self._users
+        }
+        deletes = {self._key(u) for u in self._deleted}
+        self._dirty.clear()
+        self._deleted.clear()
+        return writes, deletes
+
+    def _write(self, writes: Dict[str, Any], deletes: Set[str]) -> None:
+        if not writes and not deletes:
+            return
+        with self._store().batch() as b:
+            for key in deletes:
+                b.delete(key)
+            for key, value in writes.items():
+                b.set(key, value)
+
+    def flush(self) -> None:
+        """Write pending changes and wait for them (shutdown, tests); ordered after any write-behind."""
+        writes, deletes = self._pending()
+        self._last_flush = time.monotonic()
+        self._writer.submit(self._write, writes, deletes).result()
+
+    def _maybe_flush(self) -> None:
+        """Write behind on the writer thread at most every flush_interval seconds."""
+        if time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        if self._flushing is not None and not self._flushing.done():
+            return
+        writes, deletes = self._pending()
+        self._last_flush = time.monotonic()
+        if writes or deletes:
+            self._flushing = self._writer.submit(self._write, writes, deletes)
+            self._flushing.add_done_callback(self._flush_done)
+
+    def _flush_done(self, fut: Future) -> None:
+        if not fut.cancelled() and fut.exception():
+            logger.warning("Could not persist %s rotation state: %s", self.namespace, fut.exception())
+
+    def stats(self) -> Dict[str, Any]:
+        evictions = self.lru_evictions + self.idle_evictions
+        return {
+            "size": len(self._users),
+            "maxsize": self.maxsize,
+            "lru_evictions": self.lru_evictions,
+            "idle_evictions": self.idle_evictions,
+            "eviction_rate": evictions / self.lookups if self.lookups else 0.0,
+        }
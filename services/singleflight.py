@@ -0,0 +1,62 @@
+"""
+Single-flight request coalescing — concurrent callers for the same key
+share one in-flight coroutine and all receive its result or error.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent async work by key.
+
+    The shared work runs in its own task, so a caller being cancelled does
+    not cancel the fetch other callers are waiting on.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def start(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> asyncio.Task:
+        """Return the in-flight task for `key`, starting `fn(*args, **kwargs)` if none exists."""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared += 1
+            logger.debug("%s joined in-flight call for %s", self.name, key)
+            return task
+
+        task = asyncio.get_running_loop().create_task(fn(*args, **kwargs))
+        self._inflight[key] = task
+        self.calls += 1
+
+        def _done(t: asyncio.Task) -> None:
+            if self._inflight.get(key) is t:
+                del self._inflight[key]
+            # Mark the exception retrieved for fire-and-forget callers of start()
+            if not t.cancelled():
+                t.exception()
+
+        task.add_done_callback(_done)
+        return task
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Run `fn` once per key at a time and return its result to every caller."""
+        return await asyncio.shield(self.start(key, fn, *args, **kwargs))
+
+    def tasks(self) -> List[asyncio.Task]:
+        return list(self._inflight.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._inflight), "fetches": self.calls, "coalesced": self.shared}
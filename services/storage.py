@@ -1,17 +1,234 @@
-﻿import os, json
-from typing import Any, Dict
+﻿"""
+Persistent state — SQLite (WAL) key/value store with an in-process read cache.
+
+Replaces the whole-file state.json rewrites: each key is its own row, writes
+are transactional (batches commit atomically or not at all), and an existing
+state.json is imported once on first open.
+"""
+import os
+import json
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
 from config import SETTINGS
-STATE_FILE = os.path.join(SETTINGS.DATA_DIR, "state.json")
-LOG_FILE = os.path.join(SETTINGS.DATA_DIR, "price_log.jsonl")
-os.makedirs(SETTINGS.DATA_DIR, exist_ok=True)
+from services.pricelog import price_log
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = os.path.join(SETTINGS.DATA_DIR, "state.json")  # legacy, migrated on first open
+DB_FILE = os.path.join(SETTINGS.DATA_DIR, "state.db")
+CACHE_SIZE = 1024
+
+_MISSING = object()
+
+
+class KVBatch:
+    """Writes staged inside KVStore.batch(); applied in one transaction on exit."""
+
+    def __init__(self):
+        self.ops: List[Tuple[str, Optional[str]]] = []
+
+    def set(self, key: str, value: Any) -> None:
+        self.ops.append((key, json.dumps(value, separators=(",", ":"))))
+
+    def delete(self, key: str) -> None:
+        self.ops.append((key, None))
+
+
+class KVStore:
+    """
+    Per-key JSON values in a SQLite database in WAL mode.
+
+    Reads go through a bounded LRU cache of encoded values (decoded per call,
+    so callers may mutate what they get back). The connection is shared
+    across threads behind a lock.
+    """
+
+    def __init__(self, path: str = DB_FILE, legacy_json: Optional[str] = STATE_FILE, cache_size: int = CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        if legacy_json:
+            self.migrate_json(legacy_json)
+
+    # --- cache ------------------------------------------------------------
+
+    def _remember(self, key: str, encoded: Optional[str]) -> None:
+        self._cache[key] = encoded
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _encoded(self, key: str) -> Optional[str]:
+        encoded = self._cache.get(key, _MISSING)
+        if encoded is not _MISSING:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return encoded
+        self.misses += 1
+        row = self._db.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        encoded = row[0] if row else None
+        self._remember(key, encoded)  # absent keys are cached too
+        return encoded
+
+    # --- reads ------------------------------------------------------------
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            encoded = self._encoded(key)
+        return default if encoded is None else json.loads(encoded)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return self._encoded(key) is not None
+
+    def items(self, prefix: str = "") -> Iterator[Tuple[str, Any]]:
+        """All (key, value) pairs whose key starts with `prefix`, in key order."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, value FROM kv WHERE substr(key, 1, ?) = ? ORDER BY key", (len(prefix), prefix)
+            ).fetchall()
+        for key, encoded in rows:
+            yield key, json.loads(encoded)
+
+    def all(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    # --- writes -----------------------------------------------------------
+
+    @contextmanager
+    def batch(self) -> Iterator[KVBatch]:
+        """Stage several writes and commit them atomically; nothing is applied if the block raises."""
+        b = KVBatch()
+        yield b
+        if b.ops:
+            self._apply(b.ops)
+
+    def _apply(self, ops: List[Tuple[str, Optional[str]]]) -> None:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for key, encoded in ops:
+                    if encoded is None:
+                        self._db.execute("DELETE FROM kv WHERE key = ?", (key,))
+                    else:
+                        self._db.execute(
+                            "INSERT INTO kv (key, value) VALUES (?, ?) "
+                            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                            (key, encoded),
+                        )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            for key, encoded in ops:
+                self._remember(key, encoded)
+
+    def set(self, key: str, value: Any) -> None:
+        with self.batch() as b:
+            b.set(key, value)
+
+    def delete(self, key: str) -> None:
+        with self.batch() as b:
+            b.delete(key)
+
+    def set_many(self, values: Dict[str, Any]) -> None:
+        with self.batch() as b:
+            for key, value in values.items():
+                b.set(key, value)
+
+    def replace_all(self, values: Dict[str, Any]) -> None:
+        """Make the store hold exactly `values`, atomically."""
+        with self._lock:
+            stale = [k for k, _ in self.items() if k not in values]
+            with self.batch() as b:
+                for key in stale:
+                    b.delete(key)
+                for key, value in values.items():
+                    b.set(key, value)
+
+    # --- migration / lifecycle -------------------------------------------
+
+    def migrate_json(self, path: str) -> int:
+        """
+        Import a legacy state.json (top-level keys become rows) and rename it
+        to *.migrated. Existing rows win, so re-running after a crash between
+        commit and rename is harmless.
+        """
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Could not read legacy state %s, leaving it in place: %s", path, e)
+            return 0
+        if not isinstance(legacy, dict):
+            logger.warning("Legacy state %s is not a JSON object, leaving it in place", path)
+            return 0
+        with self._lock:
+            existing = {k for k, _ in self.items()}
+            with self.batch() as b:
+                for key, value in legacy.items():
+                    if key not in existing:
+                        b.set(key, value)
+        os.replace(path, path + ".migrated")
+        logger.info("Migrated %d keys from %s to %s", len(legacy), path, self.path)
+        return len(legacy)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+            self._cache.clear()
+
+
+_store: Optional[KVStore] = None
+
+
+def get_store() -> KVStore:
+    """The process-wide store, opened (and migrated) on first use."""
+    global _store
+    if _store is None:
+        _store = KVStore()
+    return _store
+
+
+def close_store() -> None:
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
+
+
 class KV:
+    """Whole-state facade kept for existing callers; prefer get_store().get/set per key."""
     @staticmethod
     def get() -> Dict[str, Any]:
-        if not os.path.exists(STATE_FILE): return {}
-        with open(STATE_FILE, "r") as f: return json.load(f)
+        return get_store().all()
     @staticmethod
     def set(state: Dict[str, Any]):
-        with open(STATE_FILE, "w") as f: json.dump(state, f, indent=2)
+        get_store().replace_all(state)
     @staticmethod
     def log(line: Dict[str, Any]):
-        with open(LOG_FILE, "a") as f: f.write(json.dumps(line) + "\n")
+        price_log.write(line)